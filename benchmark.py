@@ -0,0 +1,168 @@
+"""
+Command line entry point for all tools of the benchmark
+
+Usage: python benchmark.py <command> [options], see python benchmark.py <command> --help
+
+    run       sets up a network, runs a test and plots its results (runTest.py)
+    sample    measures a network that is already running, without publishing anything
+    plot      plots test runs (plotDiskUsage.py)
+    predict   learns how disk space grows from past test runs (predictDiskUsage.py)
+    plan      predicts and ranks disk usage of many transaction scenarios (planner.py)
+    search    lists the runs in the catalog with the given parameters
+    status    shows the runs in the catalog by status
+    latency   reports throughput and latency of test runs (latency.py)
+    sweep     runs a parameter sweep (sweep.py)
+
+run and sample take parameters from a json config file (--config) and/or single values
+(--set key=value, with values in json), applied on top of params.py like a configuration of a sweep,
+e.g. python benchmark.py run --set txSize=64 --set offchain=false
+
+Each command only imports the modules it needs, so quick commands like search and status start fast
+"""
+
+import argparse
+import importlib
+import json
+import sys
+
+
+def parseValue(text):
+    """
+    Parses a value given on the command line as json, or returns it as a string
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def readConfig(args):
+    """
+    Returns the parameters given by --config and --set, where --set takes precedence
+    """
+    config = {}
+    if args.config:
+        with open(args.config) as infile:
+            config.update(json.load(infile))
+    for assignment in args.set:
+        key, separator, value = assignment.partition("=")
+        if not separator:
+            raise SystemExit("expected key=value instead of " + assignment)
+        config[key] = parseValue(value)
+    return config
+
+
+def applyConfig(args):
+    import sweep
+    sweep.applyConfig(readConfig(args))
+
+
+def run(args):
+    applyConfig(args)
+    import runTest
+    runTest.main()
+
+
+def sample(args):
+    """
+    Measures the running network for testDuration minutes into a new test directory
+    """
+    applyConfig(args)
+    import catalog
+    import params
+    import runTest
+
+    directory = runTest.createDirectory()
+    runTest.saveParams(directory)
+    catalog.recordParams(directory, params)
+    runTest.getMeasurements(directory)
+    catalog.recordSummary(directory)
+    if args.plot:
+        runTest.plotResults(directory)
+
+
+def search(args):
+    import catalog
+
+    filters = readConfig(args)
+    if args.offchain is not None:
+        filters["offchain"] = args.offchain == "y"
+    filters["txSize"] = args.txsize
+    filters["status"] = args.status
+
+    for run in catalog.query(**filters):
+        print (run["directory"] + "\t" + str(run["status"]))
+
+
+def status(args):
+    import catalog
+
+    runs = catalog.query(orderBy="created")
+    counts = {}
+    for run in runs:
+        counts[run["status"]] = counts.get(run["status"], 0) + 1
+    print (str(len(runs)) + " runs: " + ", ".join(str(count) + " " + str(name) for name, count in sorted(counts.items(), key=lambda item: str(item[0]))))
+
+    for run in runs[-args.last:] if args.last else []:
+        summary = run["summary"] or {}
+        values = [run["directory"], str(run["status"]),
+                  "offchain" if run["params"].get("offchain") else "onchain",
+                  str(run["params"].get("txSize")) + " KB"]
+        if "duration" in summary:
+            values.append(str(round(summary["duration"] / 60, 1)) + " min")
+        if "txPerSecond" in summary:
+            values.append(str(round(summary["txPerSecond"], 2)) + " tx/s")
+        print ("  " + "\t".join(values))
+
+
+# commands that pass all their arguments on to the main function of a module
+FORWARDED = {
+    "plot": ("plotDiskUsage", "plot test runs"),
+    "predict": ("predictDiskUsage", "learn from past test runs"),
+    "plan": ("planner", "predict disk usage of many scenarios"),
+    "latency": ("latency", "report throughput and latency"),
+    "sweep": ("sweep", "run a parameter sweep"),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in FORWARDED:
+        importlib.import_module(FORWARDED[argv[0]][0]).main(argv[1:])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark of disk usage of MultiChain networks")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    configurable = argparse.ArgumentParser(add_help=False)
+    configurable.add_argument("--config", help="json file with values of params.py")
+    configurable.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                              help="value of params.py, in json (repeatable)")
+
+    command = commands.add_parser("run", parents=[configurable], help="set up a network and run a test")
+    command.set_defaults(func=run)
+
+    command = commands.add_parser("sample", parents=[configurable], help="measure a running network")
+    command.add_argument("--plot", action="store_true", help="plot the measurements afterwards")
+    command.set_defaults(func=sample)
+
+    command = commands.add_parser("search", parents=[configurable], help="list runs with given parameters")
+    command.add_argument("--offchain", choices=["y", "n"], help="only offchain or onchain runs")
+    command.add_argument("--txsize", type=float, help="only runs with this transaction size")
+    command.add_argument("--status", help="only runs with this status, e.g. done")
+    command.set_defaults(func=search)
+
+    command = commands.add_parser("status", help="show the runs in the catalog")
+    command.add_argument("--last", type=int, default=10, help="number of most recent runs to list")
+    command.set_defaults(func=status)
+
+    for name, (module, description) in FORWARDED.items():
+        commands.add_parser(name, help=description + ", see " + name + " --help")
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
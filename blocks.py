@@ -0,0 +1,103 @@
+"""
+Incremental tracking of the blocks mined during a test
+
+Every block between the last seen height and the current tip is fetched with a single
+listblocks range call, so no block is missed if several arrive within one measureDelay.
+Sizes and tx counts are cached by height, which gives both the growth of the chain and
+the throughput of the network (tx/s, KB/s)
+
+The same call also re-reads the last REORGDEPTH heights that were already seen. A block whose
+hash changed was replaced by a reorg and is counted with its new size, blocks above a tip that
+went back are dropped
+"""
+
+from helpers import *
+
+
+REORGDEPTH = 6              # number of recent heights checked for replaced blocks on every update
+
+
+class BlockTracker:
+    """
+    Keeps height, block time, tx count and size (KB) of all blocks seen by a node since the first update
+    """
+
+    def __init__(self, node=0):
+        self.node = node
+        self.height = None
+        self.first = None           # height of the first block seen
+        self.blocks = {}            # height -> (block time, tx count, size in KB, hash)
+        self.size = 0.              # KB, total size of all blocks in self.blocks
+
+    def fetch(self, first, last):
+        """
+        Returns the blocks with heights from first to last (inclusive)
+        """
+        blocks = rpc(self.node, "listblocks", str(first) + "-" + str(last), True)
+
+        # listblocks does not report the size of a block in all versions, ask for those in one batch
+        missing = [block for block in blocks if "size" not in block]
+        if missing:
+            sizes = batch(self.node, [("getblock", [str(block["height"])]) for block in missing])
+            for block, info in zip(missing, sizes):
+                block["size"] = info["size"]
+
+        return [(block["height"], block["time"], block["txcount"], block["size"] / 1024., block["hash"])
+                for block in blocks]
+
+    def update(self, tip):
+        """
+        Fetches all blocks up to the given tip height that have not been seen yet, as well as the
+        last REORGDEPTH blocks seen, to replace those that changed
+        Returns the new and replaced blocks as a list of (height, block time, tx count, size in KB)
+        """
+        if self.height is None:
+            self.first = first = tip
+        else:
+            # heights above a tip that went back no longer exist
+            for height in [h for h in self.blocks if h > tip]:
+                self.size -= self.blocks.pop(height)[2]
+            first = max(self.first, min(tip, self.height) - REORGDEPTH + 1)
+        self.height = tip
+        if first > tip:
+            return []
+
+        changed = []
+        for height, blockTime, txCount, size, blockHash in self.fetch(first, tip):
+            old = self.blocks.get(height)
+            if old is not None and old[3] == blockHash:
+                continue
+            if old is not None:
+                self.size -= old[2]
+            self.blocks[height] = (blockTime, txCount, size, blockHash)
+            self.size += size
+            changed.append((height, blockTime, txCount, size))
+        return changed
+
+    def chainSize(self):
+        """
+        Total size (KB) of all blocks seen so far
+        """
+        return self.size
+
+    def throughput(self, window=None):
+        """
+        Returns transactions per second (without coinbase transactions) and KB per second
+        over the blocks of the last window seconds, or over all blocks seen
+        """
+        if len(self.blocks) < 2:
+            return 0., 0.
+
+        heights = sorted(self.blocks)
+        end = self.blocks[heights[-1]][0]
+        if window is not None:
+            heights = [h for h in heights if self.blocks[h][0] >= end - window]
+
+        # the first block only marks the beginning of the interval
+        start = self.blocks[heights[0]][0]
+        if end <= start:
+            return 0., 0.
+
+        txCount = sum(self.blocks[h][1] - 1 for h in heights[1:])
+        size = sum(self.blocks[h][2] for h in heights[1:])
+        return txCount / (end - start), size / (end - start)
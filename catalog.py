@@ -0,0 +1,247 @@
+"""
+Catalog of all test runs in data/, stored in data/catalog.db (sqlite)
+
+Each run is registered when its directory is created, its parameters are recorded when the testplan
+is written and summary statistics once the measurements are done. Runs can then be selected by any
+parameter with a single query instead of scanning directories and executing their params.py
+
+Runs from before the catalog existed, or copied into data/ later, are added by rebuild(), which
+happens automatically every time the catalog is opened
+
+Functions that take a connection use it if given, otherwise they open their own and close it again
+"""
+
+from contextlib import contextmanager
+import importlib.util
+import json
+import os
+import sqlite3
+import time
+import types
+
+import numpy as np
+
+import runData
+
+
+DATADIR = "data"
+CATALOG = DATADIR + "/catalog.db"
+
+# fields with their own column, all other parameters are queried from the json of all parameters
+COLUMNS = ["status", "offchain", "txSize", "numNodes", "measureDelay", "testDuration", "txpm"]
+
+# columns runs can be ordered by, created is when a run was started
+ORDERS = ["directory", "created"] + COLUMNS
+
+
+def dumps(value):
+    """
+    Canonical json, identical to the way sqlite formats json values
+    """
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+
+def connect():
+    connection = sqlite3.connect(CATALOG, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("""CREATE TABLE IF NOT EXISTS runs (
+        directory TEXT PRIMARY KEY, created REAL, status TEXT,
+        offchain INTEGER, txSize REAL, numNodes INTEGER, measureDelay REAL, testDuration REAL, txpm TEXT,
+        params TEXT, summary TEXT)""")
+    connection.execute("CREATE INDEX IF NOT EXISTS runsBySize ON runs (offchain, txSize)")
+    connection.commit()
+    rebuild(connection)
+    return connection
+
+
+@contextmanager
+def using(connection=None):
+    """
+    Yields the given connection, or a new one that is closed afterwards
+    """
+    if connection is not None:
+        yield connection
+        return
+
+    connection = connect()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def paramsDict(params):
+    """
+    Returns all plain values of a params module as a json serializable dict
+    """
+    values = {}
+    for key, value in vars(params).items():
+        if key.startswith("__") or key == "header" or callable(value) or isinstance(value, types.ModuleType):
+            continue
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        values[key] = value
+    return values
+
+
+def register(directory, connection=None, created=None):
+    """
+    Adds a newly created test directory, created now unless given (s since the epoch)
+    """
+    with using(connection) as connection:
+        connection.execute("INSERT OR IGNORE INTO runs (directory, created, status) VALUES (?, ?, ?)",
+                           (directory, time.time() if created is None else created, "created"))
+        connection.commit()
+
+
+def recordParams(directory, params, connection=None):
+    """
+    Records the parameters of a test run
+    """
+    values = paramsDict(params)
+    with using(connection) as connection:
+        register(directory, connection)
+        connection.execute("UPDATE runs SET status = ?, offchain = ?, txSize = ?, numNodes = ?, measureDelay = ?, "
+                           "testDuration = ?, txpm = ?, params = ? WHERE directory = ?",
+                           ("running", values.get("offchain"), values.get("txSize"), values.get("numNodes"),
+                            values.get("measureDelay"), values.get("testDuration"), dumps(values.get("txpm")),
+                            dumps(values), directory))
+        connection.commit()
+
+
+def summarize(directory):
+    """
+    Summary statistics of the measurements in a test directory, None if there are none
+    """
+    try:
+        data = runData.load(directory, "measurements")
+    except FileNotFoundError:
+        return None
+
+    summary = {
+        "duration": float(data[-1, 0]),
+        "samples": int(data.shape[0]),
+        "chainSize": float(data[-1, 1]),
+        "items": float(data[-1, 2]),
+        "diskSpace": [float(el) for el in data[-1, 3:]],
+    }
+
+    # throughput over all blocks mined during the test, without coinbase transactions
+    try:
+        blocks = runData.load(directory, "blocks")
+        # a block replaced by a reorg is recorded again, only the last row of each height counts
+        _, last = np.unique(blocks[::-1, 0], return_index=True)
+        blocks = blocks[len(blocks) - 1 - last]
+        span = blocks[-1, 1] - blocks[0, 1]
+        if span > 0:
+            summary["txPerSecond"] = float(np.sum(blocks[1:, 2] - 1) / span)
+            summary["KBPerSecond"] = float(np.sum(blocks[1:, 3]) / span)
+    except (FileNotFoundError, IndexError):
+        pass
+
+    # mean CPU load (share of a core) and peak resident memory (KB) of each container, see telemetry.py
+    try:
+        usage = np.asarray(runData.load(directory, "telemetry"), dtype=float)
+        width = (usage.shape[1] - 1) // data[:, 3:].shape[1]
+        span = usage[-1, 0] - usage[0, 0]
+        if span > 0:
+            summary["cpu"] = [float((usage[-1, j] - usage[0, j]) / span) for j in range(1, usage.shape[1], width)]
+            summary["rss"] = [float(np.nanmax(usage[:, j + 1])) for j in range(1, usage.shape[1], width)]
+    except (FileNotFoundError, IndexError, ValueError):
+        pass
+
+    # end of warm-up of each column, see steadystate.py (imported here as it pulls in scipy)
+    import steadystate
+    summary["steadyState"] = steadystate.window(directory)["startTime"]
+
+    # overall publish and end-to-end latency, see latency.py
+    try:
+        with open(directory + "/latency.json") as infile:
+            result = json.load(infile)
+        summary["latency"] = dict((kind, result[kind]["all"]) for kind in result)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return summary
+
+
+def recordSummary(directory, connection=None):
+    """
+    Records summary statistics of a finished test run
+    """
+    summary = summarize(directory)
+    with using(connection) as connection:
+        connection.execute("UPDATE runs SET status = ?, summary = ? WHERE directory = ?",
+                           ("done" if summary else "incomplete", dumps(summary), directory))
+        connection.commit()
+
+
+def loadParams(directory):
+    spec = importlib.util.spec_from_file_location("params.py", directory + "/params.py")
+    params = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(params)
+    return params
+
+
+def rebuild(connection=None):
+    """
+    Adds all test directories in data/ that are not in the catalog yet, executing their params.py once
+    """
+    with using(connection) as connection:
+        known = set(row["directory"] for row in connection.execute("SELECT directory FROM runs"))
+
+        for name in sorted(os.listdir(DATADIR)):
+            directory = DATADIR + "/" + name
+            if directory in known or not os.path.isfile(directory + "/params.py"):
+                continue
+            # the copy of params.py is written when a run starts, once registered a run is not read again
+            register(directory, connection, os.path.getmtime(directory + "/params.py"))
+            try:
+                params = loadParams(directory)
+            except Exception as e:
+                print ("Warning: cannot index " + directory + ", its params.py failed: " + repr(e))
+                continue
+            recordParams(directory, params, connection)
+            recordSummary(directory, connection)
+
+
+def query(connection=None, orderBy="directory", **filters):
+    """
+    Returns all runs whose parameters equal the given values, e.g. query(offchain=True, txSize=128)
+    Filters with value None are ignored. Each run is a dict with its directory, status, params and summary
+    Runs are ordered by orderBy, one of ORDERS, e.g. "created" for the oldest run first
+    """
+    if orderBy not in ORDERS:
+        raise ValueError("cannot order runs by " + str(orderBy))
+
+    conditions, values = [], []
+    for key, value in filters.items():
+        if value is None:
+            continue
+        if key in COLUMNS:
+            conditions.append(key + " = ?")
+        else:
+            conditions.append("json_extract(params, ?) = ?")
+            values.append("$." + key)
+        values.append(dumps(value) if isinstance(value, (list, dict)) else value)
+
+    sql = "SELECT * FROM runs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    with using(connection) as connection:
+        rows = connection.execute(sql + " ORDER BY " + orderBy + ", directory", values).fetchall()
+
+    return [{"directory": row["directory"], "status": row["status"],
+             "params": json.loads(row["params"]) if row["params"] else {},
+             "summary": json.loads(row["summary"]) if row["summary"] else None} for row in rows]
+
+
+def runParams(run):
+    """
+    Parameters of a run from query() as an object, like the params module of that run
+    """
+    return types.SimpleNamespace(**run["params"])
@@ -0,0 +1,85 @@
+"""
+Host side of the disk usage agent in templates/base/duagent.py
+
+Starts one long-running agent per node through docker exec and keeps the most recent
+disk usage of every directory in the chain folder, as streamed by the agent. Reading
+a measurement from the agent costs nothing, regardless of the size of the chain
+"""
+
+import json
+import subprocess
+import threading
+import time
+
+import params
+
+
+AGENT = "templates/base/duagent.py"
+
+
+class DiskAgent:
+    """
+    Disk usage of the chain directory on one node, updated in the background by its agent
+    """
+
+    def __init__(self, node, chainDir):
+        self.node = node
+        self.container = params.containerName + str(node)
+        self.chainName = chainDir.rstrip("/").rsplit("/", 1)[1]
+        self.sizes = {}
+        self.received = None
+        self.lock = threading.Lock()
+        self.updated = threading.Event()
+
+        # copy the current agent into the container, so older images can run it as well
+        subprocess.call("docker cp " + AGENT + " " + self.container + ":/root/duagent.py", shell=True)
+
+        interval = str(min(1, params.measureDelay / 2))
+        cmd = ["docker", "exec", "-i", self.container, "python3", "-u", "/root/duagent.py", chainDir, interval]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+
+        self.thread = threading.Thread(target=self.read, daemon=True)
+        self.thread.start()
+
+    def read(self):
+        """
+        Applies size deltas streamed by the agent until it exits
+        """
+        for line in self.process.stdout:
+            try:
+                update = json.loads(line)
+            except ValueError:
+                continue
+            with self.lock:
+                self.sizes.update(update["sizes"])
+                for directory in update["removed"]:
+                    self.sizes.pop(directory, None)
+                self.received = time.time()
+            self.updated.set()
+
+    def ready(self, timeout):
+        """
+        Waits for the first full report of the agent, returns whether it arrived
+        """
+        return self.updated.wait(timeout) and self.process.poll() is None
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def total(self):
+        """
+        Returns the time of the last report and the disk space (KB) of the chain directory
+        """
+        with self.lock:
+            return self.received, float(self.sizes[self.chainName])
+
+    def detailed(self):
+        """
+        Returns the time of the last report and disk space (KB) of all subdirectories of the chain directory
+        """
+        with self.lock:
+            return self.received, dict(self.sizes)
+
+    def close(self):
+        if self.alive():
+            self.process.terminate()
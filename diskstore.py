@@ -0,0 +1,119 @@
+"""
+Columnar storage for detailed disk space measurements
+
+Each node gets two files in the test directory:
+- diskspaceN.json: the columns, i.e. "time" followed by the subdirectories of the chain folder
+- diskspaceN.dat: one record of float64 values (s, KB) per measurement, in the order of the columns
+
+The raw file can be appended to cheaply and loaded without any parsing. If a new subdirectory shows
+up during a test, the existing records are rewritten once with an additional column (NaN where unknown)
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from sinks import DTYPE, Sink, readRecords, writeHeader
+
+
+def paths(directory, i):
+    base = directory + "/diskspace" + str(i)
+    return base + ".json", base + ".dat"
+
+
+def parseDu(output):
+    """
+    Parses du output into a dict of disk space (KB) by path relative to the multichain folder,
+    e.g. {"chain1/blocks": 17432.0}
+    """
+    sizes = {}
+    for line in output.replace("\r\n", "\n").split("\n"):
+        if "\t" in line:
+            size, path = line.split("\t", 1)
+            sizes[path.split("/.multichain/", 1)[-1]] = float(size)
+    return sizes
+
+
+class DiskStore(Sink):
+    """
+    Appends detailed disk space measurements of one node to its store
+    """
+
+    def __init__(self, directory, i):
+        self.header, data = paths(directory, i)
+        self.columns = ["time"]
+        if os.path.isfile(self.header):
+            with open(self.header) as infile:
+                self.columns = json.load(infile)["columns"]
+        self.index = dict((column, j) for j, column in enumerate(self.columns))
+        super().__init__(data, "ab")
+
+    def widen(self, newColumns):
+        """
+        Adds columns to the store, rewriting all records written so far
+        """
+        old = len(self.columns)
+        self.columns += newColumns
+        self.index = dict((column, j) for j, column in enumerate(self.columns))
+
+        self.file.flush()
+        records = np.fromfile(self.path, dtype=DTYPE).reshape(-1, old)
+        if records.shape[0] > 0:
+            padded = np.full((records.shape[0], len(self.columns)), np.nan, dtype=DTYPE)
+            padded[:, :old] = records
+            padded.tofile(self.path)
+
+        writeHeader(self.path, self.columns)
+
+    def append(self, time, sizes):
+        """
+        Appends one measurement, given as elapsed time (s) and a dict of disk space (KB) by path
+        """
+        newColumns = sorted(path for path in sizes if path not in self.index)
+        if newColumns or not os.path.isfile(self.header):
+            self.widen(newColumns)
+
+        record = np.full((len(self.columns),), np.nan, dtype=DTYPE)
+        record[0] = time
+        for path, size in sizes.items():
+            record[self.index[path]] = size
+
+        self.file.write(record.tobytes())
+        self.written()
+
+
+def exists(directory, i):
+    return os.path.isfile(paths(directory, i)[0])
+
+
+def read(directory, i):
+    """
+    Returns the columns and a read-only, memory-mapped (measurements x columns) array of the store of the given node
+    """
+    return readRecords(paths(directory, i)[1])
+
+
+def convertLegacy(directory, i):
+    """
+    Converts the raw du strings written by older test runs (diskspaceN.csv) into a store
+    """
+    csv.field_size_limit(1 << 30)
+    with open(directory + "/diskspace" + str(i) + ".csv") as infile:
+        rows = [(float(row[0]), parseDu(row[1])) for row in csv.reader(infile)]
+
+    columns = ["time"]
+    for _, sizes in rows:
+        columns += [path for path in sizes if path not in columns]
+    index = dict((column, j) for j, column in enumerate(columns))
+
+    records = np.full((len(rows), len(columns)), np.nan, dtype=DTYPE)
+    for r, (time, sizes) in enumerate(rows):
+        records[r, 0] = time
+        for path, size in sizes.items():
+            records[r, index[path]] = size
+
+    data = paths(directory, i)[1]
+    records.tofile(data)
+    writeHeader(data, columns)
@@ -0,0 +1,76 @@
+"""
+Decimation of long measurement series before plotting
+
+Long runs have far more samples per line than a plot has pixels. Both methods below reduce a
+series to a bounded number of points while preserving its visible shape:
+- lttb: largest-triangle-three-buckets, keeps the point of each bucket that spans the largest
+  triangle with its neighbours, good for smooth series such as disk space over time
+- minmax: keeps the minimum and maximum of each bucket, preserves every spike (envelope)
+"""
+
+import numpy as np
+
+
+def lttb(x, y, n):
+    """
+    Returns n points of (x, y) selected with largest-triangle-three-buckets
+    """
+    N = len(x)
+    if n >= N or n < 3:
+        return x, y
+
+    # the first and last point are always kept, the rest is split into n - 2 buckets
+    edges = np.linspace(1, N - 1, n - 1).astype(int)
+    index = np.empty(n, dtype=int)
+    index[0], index[-1] = 0, N - 1
+
+    a = 0
+    for b in range(n - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        nextLo, nextHi = hi, (edges[b + 2] if b + 2 < n - 1 else N)
+        nextX, nextY = x[nextLo:max(nextHi, nextLo + 1)].mean(), y[nextLo:max(nextHi, nextLo + 1)].mean()
+
+        area = np.abs((x[a] - nextX) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (nextY - y[a]))
+        a = lo + int(np.argmax(area))
+        index[b + 1] = a
+
+    return x[index], y[index]
+
+
+def minMax(x, y, n):
+    """
+    Returns at most n points of (x, y): the minimum and maximum of each of n / 2 buckets, in order
+    """
+    N = len(x)
+    buckets = n // 2
+    if n >= N or buckets < 1:
+        return x, y
+
+    size = int(np.ceil(N / buckets))
+    padded = np.full(buckets * size, np.nan)
+    padded[:N] = y
+    padded = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    filled = ~np.all(np.isnan(padded), axis=1)
+    lows = offsets[filled] + np.nanargmin(padded[filled], axis=1)
+    highs = offsets[filled] + np.nanargmax(padded[filled], axis=1)
+
+    index = np.unique(np.concatenate((lows, highs)))
+    return x[index], y[index]
+
+
+def decimate(x, y, n, method="lttb"):
+    """
+    Reduces a series to at most n points with the given method ("lttb", "minmax" or None for all points)
+    Samples where y is NaN are dropped
+    """
+    x, y = np.ravel(x), np.ravel(y)
+    finite = ~np.isnan(y)
+    x, y = x[finite], y[finite]
+
+    if method == "lttb":
+        return lttb(x, y, n)
+    elif method == "minmax":
+        return minMax(x, y, n)
+    return x, y
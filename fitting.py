@@ -0,0 +1,154 @@
+"""
+Vectorized least squares fits of disk space against time
+
+Fits a line to every column of every run at once with closed-form least squares in NumPy, instead of
+fitting one sklearn model per column. Runs of different lengths are padded and masked, so fitting all
+columns of all runs in the catalog is a single call. Used by both plotDiskUsage and predictDiskUsage
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy import stats
+
+
+# per column: slope (KB/s), intercept (KB), standard error of the slope, residual standard deviation,
+# half width of the confidence interval of the slope and number of samples used
+Fit = namedtuple("Fit", ["slope", "intercept", "stderr", "residual", "ci", "n"])
+
+
+def emptyFit(columns):
+    """
+    Returns the Fit of columns without any samples, NaN for all but the number of samples
+    """
+    nan = np.full(columns, np.nan)
+    return Fit(nan, nan, nan, nan, nan, np.zeros(columns))
+
+
+def fitMasked(T, Y, M, confidence=0.95):
+    """
+    Fits y = intercept + slope * t to each column of Y (samples x columns) against the same column of T,
+    only using samples where the boolean mask M is set
+    """
+    if np.size(M) == 0:
+        return emptyFit(np.shape(M)[1] if np.ndim(M) == 2 else 0)
+
+    M = M.astype(float)
+    n = M.sum(axis=0)
+    T, Y = np.where(M > 0, T, 0.), np.where(M > 0, Y, 0.)
+
+    # center before summing to stay accurate with large times and sizes
+    tMean = (M * T).sum(axis=0) / n
+    yMean = (M * Y).sum(axis=0) / n
+    dt, dy = M * (T - tMean), M * (Y - yMean)
+
+    sxx = (dt * dt).sum(axis=0)
+    slope = (dt * dy).sum(axis=0) / sxx
+    intercept = yMean - slope * tMean
+
+    sse = ((dy - slope * dt) ** 2).sum(axis=0)
+    dof = np.maximum(n - 2, 1)
+    residual = np.sqrt(sse / dof)
+    stderr = residual / np.sqrt(sxx)
+    ci = stats.t.ppf(0.5 + confidence / 2, dof) * stderr
+
+    return Fit(slope, intercept, stderr, residual, ci, n)
+
+
+def fitColumns(time, data, startrow=0, confidence=0.95):
+    """
+    Fits each column of data (samples x columns) against time, using samples from startrow onward
+    startrow may also be an array with a separate start for each column
+    """
+    data = np.asarray(data, dtype=float)
+    if data.size == 0:
+        return emptyFit(data.shape[1] if data.ndim == 2 else 0)
+    T = np.repeat(np.asarray(time, dtype=float).reshape(-1, 1), data.shape[1], axis=1)
+    M = np.arange(data.shape[0]).reshape(-1, 1) >= np.asarray(startrow).reshape(1, -1)
+    return fitMasked(T, data, M & ~np.isnan(data), confidence)
+
+
+def fitRuns(runs, confidence=0.95):
+    """
+    Fits all columns of many runs in one call
+    Takes a list of (time, data, startrow) with data of shape (samples x columns), and returns a Fit per run
+    """
+    if not runs:
+        return []
+
+    length = max(data.shape[0] for _, data, _ in runs)
+    width = sum(data.shape[1] for _, data, _ in runs)
+    T, Y = np.zeros((length, width)), np.zeros((length, width))
+    M = np.zeros((length, width), dtype=bool)
+
+    j = 0
+    for time, data, startrow in runs:
+        n, m = data.shape
+        T[:n, j:j + m] = np.asarray(time, dtype=float).reshape(-1, 1)
+        Y[:n, j:j + m] = data
+        M[:n, j:j + m] = np.arange(n).reshape(-1, 1) >= np.asarray(startrow).reshape(1, -1)
+        j += m
+    M &= ~np.isnan(Y)
+
+    fit = fitMasked(T, Y, M, confidence)
+
+    fits, j = [], 0
+    for _, data, _ in runs:
+        m = data.shape[1]
+        fits.append(Fit(*(field[j:j + m] for field in fit)))
+        j += m
+    return fits
+
+
+class OnlineFit:
+    """
+    Running least squares fit of several columns against time, updated one measurement at a time
+    Keeps Welford-style running means and co-moments, so it is numerically stable and costs O(columns)
+    per update regardless of the length of the test
+    """
+
+    def __init__(self, columns):
+        self.n = 0
+        self.tMean, self.sxx = 0., 0.
+        self.yMean = np.zeros(columns)
+        self.sxy = np.zeros(columns)
+        self.syy = np.zeros(columns)
+
+    def update(self, t, y):
+        y = np.asarray(y, dtype=float)
+        self.n += 1
+        dt, dy = t - self.tMean, y - self.yMean
+        self.tMean += dt / self.n
+        self.yMean += dy / self.n
+        self.sxx += dt * (t - self.tMean)
+        self.sxy += dt * (y - self.yMean)
+        self.syy += dy * (y - self.yMean)
+
+    def fit(self, confidence=0.95):
+        """
+        Returns the current Fit of all columns, None until there are at least three measurements
+        """
+        if self.n < 3 or self.sxx <= 0:
+            return None
+        slope = self.sxy / self.sxx
+        intercept = self.yMean - slope * self.tMean
+        sse = np.maximum(self.syy - slope * self.sxy, 0)
+        residual = np.sqrt(sse / (self.n - 2))
+        stderr = residual / np.sqrt(self.sxx)
+        ci = stats.t.ppf(0.5 + confidence / 2, self.n - 2) * stderr
+        return Fit(slope, intercept, stderr, residual, ci, np.full(slope.shape, self.n))
+
+    def project(self, t):
+        """
+        Returns the fitted values of all columns at time t (s)
+        """
+        fit = self.fit()
+        return None if fit is None else fit.intercept + fit.slope * t
+
+
+def converged(fit, tolerance, floor):
+    """
+    Whether the confidence intervals of all slopes are within tolerance (relative) of the slope,
+    where slopes below floor (KB/s), e.g. of idle nodes, are compared against floor instead
+    """
+    return fit is not None and bool(np.all(fit.ci <= tolerance * np.maximum(np.abs(fit.slope), floor)))
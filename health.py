@@ -0,0 +1,70 @@
+"""
+Readiness probes for the nodes of the network
+
+Polls all nodes concurrently until they answer rpc calls and are connected to the expected
+number of peers, and waits for transactions to be confirmed, instead of sleeping for a fixed time
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import requests
+
+from helpers import *
+import params
+
+
+def expectedPeers(node):
+    """
+    Slave nodes connect to the masternode, the masternode to all slave nodes
+    """
+    return params.numNodes - 1 if node == 0 else 1
+
+
+def probeNode(node):
+    """
+    Returns the number of peers of the given node, or None if it doesn't answer (yet)
+    """
+    try:
+        rpc(node, "getinfo")
+        return len(rpc(node, "getpeerinfo"))
+    except (requests.exceptions.RequestException, RpcError, ValueError):
+        return None
+
+
+def waitForNode(node, start):
+    """
+    Waits until the node has been answering with enough peers for readyStable seconds,
+    since slave nodes restart multichaind once shortly after they first come up
+    Returns the time (s since start) at which the node became ready
+    """
+    readySince = None
+
+    def ready():
+        nonlocal readySince
+        if (probeNode(node) or 0) >= expectedPeers(node):
+            readySince = readySince or time.time()
+            return time.time() - readySince >= params.readyStable
+        readySince = None
+        return False
+
+    waitFor(ready, "node " + str(node) + " to come up")
+    return readySince - start
+
+
+def waitForNodes(start):
+    """
+    Waits for all nodes concurrently, returns the startup latency (s since start) of each node
+    """
+    with ThreadPoolExecutor(max_workers=params.sampleWorkers) as pool:
+        return list(pool.map(lambda node: waitForNode(node, start), range(params.numNodes)))
+
+
+def waitForConfirmations(node, txids, what):
+    """
+    Waits until all given transactions of the wallet of the node are in a block
+    """
+    if not txids:
+        return
+    confirmed = lambda: all(tx["confirmations"] > 0 for tx in batch(node, [("getwallettransaction", [txid]) for txid in txids]))
+    waitFor(confirmed, what + " to be confirmed")
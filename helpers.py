@@ -1,15 +1,108 @@
-import numpy as np
-import requests
-import os
-import importlib.util
+import subprocess
+import threading
+import time
 import params
 
+# numpy and requests are imported by the functions that need them, so tools without them start up quickly
+
+
+sessions = {}
+sessionLock = threading.Lock()
+
+
+class RpcError(Exception):
+    """
+    Raised when a node answers a json-rpc call with an error
+    """
+    pass
+
+
+def getSession(node):
+    """
+    Returns the keep-alive session for the rpc port of the given node, creating it on first use
+    Connection failures are retried with backoff, calls that reached the node are never resent
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    with sessionLock:
+        if node not in sessions:
+            retry = Retry(total=params.rpcRetries, read=0, backoff_factor=0.2)
+            adapter = HTTPAdapter(pool_maxsize=params.sampleWorkers, max_retries=retry)
+            session = requests.Session()
+            session.headers.update(params.header)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[node] = session
+        return sessions[node]
+
 
 def post(node, data):
     """
-    Streamlines http post requests for local networks
+    Streamlines http post requests for local networks, reusing one connection pool per node
+    """
+    return getSession(node).post(params.host + ":" + str(params.rpcPorts[node]), json=data, timeout=params.rpcTimeout)
+
+
+def rpc(node, method, *args):
+    """
+    Calls a single method on the given node and returns its result
+    """
+    response = post(node, {"method": method, "params": list(args)}).json()
+    if response.get("error"):
+        raise RpcError(method + ": " + str(response["error"]))
+    return response["result"]
+
+
+def batch(node, calls):
+    """
+    Sends a list of (method, params) calls to the given node as one json-rpc batch request
+    Returns their results in the order of the calls
     """
-    return requests.post(params.host + ":" + str(params.rpcPorts[node]), headers=params.header, json=data)
+    data = [{"jsonrpc": "1.0", "id": i, "method": method, "params": list(args)} for i, (method, args) in enumerate(calls)]
+    responses = sorted(post(node, data).json(), key=lambda response: response["id"])
+
+    results = []
+    for (method, _), response in zip(calls, responses):
+        if response.get("error"):
+            raise RpcError(method + ": " + str(response["error"]))
+        results.append(response["result"])
+    return results
+
+
+def compose(command):
+    """
+    Runs a docker-compose command for the network described by params.composeFile
+    """
+    return subprocess.call("docker-compose -f " + params.composeFile + " -p " + params.composeProject + " " + command, shell=True)
+
+
+def waitFor(condition, what, timeout=None):
+    """
+    Polls condition every pollInterval seconds until it returns something truthy, which is returned
+    Raises TimeoutError if that doesn't happen within timeout (setupTimeout by default)
+    """
+    timeout = params.setupTimeout if timeout is None else timeout
+    deadline = time.time() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        if time.time() > deadline:
+            raise TimeoutError("timed out after " + str(timeout) + " s waiting for " + what)
+        time.sleep(params.pollInterval)
+
+
+def getTxSizes(params):
+    """
+    Returns the matrix of mean transaction sizes (KB) from each sender (row) to each receiver (column),
+    params.txSizes if given, otherwise txSize for all pairs
+    """
+    import numpy as np
+    if getattr(params, "txSizes", None) is not None:
+        return np.array(params.txSizes, dtype=float)
+    return np.full((params.numNodes, params.numNodes), float(params.txSize))
 
 
 def getSize(maxSize):
@@ -52,23 +145,24 @@ def getTxpm(tx):
     Takes a dict with party names as keys and transactions per year as values
     Returns list of labels and a transaction matrix txpm
     """
-    numParts = len(tx)
-
-    txpy = np.zeros((numParts, numParts))
-    sends, receivs, labels = [], [], []
-
-    for key in tx:
-        sends.append(tx[key])
-        receivs.append(tx[key])
-        labels.append(key)
-    receivs.append(0)
+    labels = list(tx)
+    return labels, getTxpmStack([[tx[key] for key in labels]])[0]
 
-    txpy = np.hstack((txpy, np.array([sends]).reshape(numParts, 1)))
-    txpy = np.vstack((txpy, np.array(receivs)))
 
-    convert = np.vectorize(convertYearToMin)
+def getTxpmStack(txpy):
+    """
+    Takes transactions per year of each party in many scenarios (scenarios x parties)
+    Returns the stacked transaction matrices txpm (scenarios x parties + 1 x parties + 1), in which
+    each party exchanges its transactions with an additional last node
+    """
+    import numpy as np
+    txpy = np.asarray(txpy, dtype=float)
+    numScenarios, numParts = txpy.shape
 
-    return labels, convert(txpy)
+    txpm = np.zeros((numScenarios, numParts + 1, numParts + 1))
+    txpm[:, :numParts, numParts] = convertYearToMin(txpy)
+    txpm[:, numParts, :numParts] = convertYearToMin(txpy)
+    return txpm
 
 
 def searchData():
@@ -86,18 +180,6 @@ def searchData():
     print ("txSize:", txSize)
     print ("txpm:", txpm)
 
-    for i in range(1, 20):
-
-        for direc in ["data/testfiles-offchain", "data/testfiles-onchain"]:
-            directory = direc + "-" + str(i)
-
-            if os.path.isdir(directory):
-
-                # import params from the given directory
-                spec = importlib.util.spec_from_file_location("params.py", directory + "/params.py")
-                params = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(params)
-
-                if not txSize or txSize == params.txSize:
-                    if not txpm or txpm == params.txpm:
-                        print (directory)
+    import catalog
+    for run in catalog.query(txSize=txSize or None, txpm=txpm or None):
+        print (run["directory"])
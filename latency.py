@@ -0,0 +1,233 @@
+"""
+Throughput and latency of test runs
+
+Usage: python latency.py directory [directory ...]
+
+JMeter writes every publish request with its start time, response time, success, stream and key to
+results.jtl in the test directory. In latency mode (params.latencyMode), an ItemWatcher additionally
+polls each receiver for new items on its streams during the test and writes when each item became
+visible to the received table. report() joins both into
+- publish latency, success rate and sustained tx/s per sending node and per stream
+- end-to-end latency (publish -> item visible in liststreamitems of the receiver) per receiving node and per stream
+with p50/p95/p99 of all latencies, writes them to latency.json and prints them
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import requests
+
+from helpers import *
+import catalog
+import params
+import runData
+
+
+RESULTS = "results.jtl"
+REPORT = "latency.json"
+PERCENTILES = [50, 95, 99]
+PAGE = 1000                 # maximum number of items fetched per stream and poll
+
+
+class ItemWatcher:
+    """
+    Polls the receivers of the given (sender, receiver, stream name) streams for new items in a
+    background thread and writes [sender, receiver, key, seen (s since epoch)] for each item to table
+    """
+
+    def __init__(self, streams, table):
+        self.table = table
+        self.receivers = {}
+        for sender, receiver, name in streams:
+            self.receivers.setdefault(receiver, []).append((sender, name))
+        self.offsets = dict((name, 0) for _, _, name in streams)
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def poll(self, receiver):
+        """
+        Fetches the items of all streams of the receiver that arrived since the last poll
+        """
+        streams = self.receivers[receiver]
+        pages = batch(receiver, [("liststreamitems", [name, False, PAGE, self.offsets[name]]) for _, name in streams])
+        seen = round(time.time(), 3)
+
+        for (sender, name), items in zip(streams, pages):
+            self.offsets[name] += len(items)
+            for item in items:
+                key = item["keys"][0] if "keys" in item else item["key"]
+                self.table.write([sender, receiver, int(key), seen])
+
+    def run(self):
+        while not self.stopped.is_set():
+            start = time.time()
+            for receiver in self.receivers:
+                try:
+                    self.poll(receiver)
+                except (requests.exceptions.RequestException, RpcError, ValueError):
+                    self.errors += 1
+            self.stopped.wait(max(0, params.latencyInterval - (time.time() - start)))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def streamNodes(name, streamName):
+    """
+    Returns (sender, receiver) of a paired stream name, e.g. stream0-1
+    """
+    sender, receiver = name[len(streamName):].split("-")
+    return int(sender), int(receiver)
+
+
+def encode(sender, receiver, key):
+    """
+    Packs sender, receiver and key (< 2^31) of items into a single integer per item
+    """
+    return ((np.asarray(sender, dtype=np.int64) * 64 + receiver) << 31) | np.asarray(key, dtype=np.int64)
+
+
+def readResults(directory, streamName):
+    """
+    Reads the publish requests from results.jtl
+    Returns their start times (s since epoch), response times (s), success, senders, receivers and keys
+    """
+    with open(directory + "/" + RESULTS, newline="") as infile:
+        rows = [row for row in csv.DictReader(infile) if row.get("streamname")]
+
+    nodes = np.array([streamNodes(row["streamname"], streamName) for row in rows], dtype=int).reshape(-1, 2)
+
+    start = np.array([float(row["timeStamp"]) / 1000 for row in rows])
+    elapsed = np.array([float(row["elapsed"]) / 1000 for row in rows])
+    success = np.array([row["success"] == "true" for row in rows], dtype=bool)
+    keys = np.array([int(row["uuid"] or 0) for row in rows], dtype=np.int64)
+    return start, elapsed, success, nodes[:, 0], nodes[:, 1], keys
+
+
+def describe(latencies, times):
+    """
+    Percentiles of the latencies (ms) and sustained rate (per s) of events happening at the given times
+    """
+    summary = {"count": int(len(latencies))}
+    if len(latencies):
+        for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+            summary["p" + str(p)] = round(float(value) * 1000, 1)
+    span = np.max(times) - np.min(times) if len(times) > 1 else 0
+    summary["txPerSecond"] = round(float((len(times) - 1) / span), 3) if span > 0 else None
+    return summary
+
+
+def breakdown(latencies, times, senders, receivers, byNode, streamName):
+    """
+    Describes the latencies in total, per node (sender or receiver, see byNode) and per stream
+    """
+    result = {"all": describe(latencies, times), "nodes": {}, "streams": {}}
+
+    for node in np.unique(byNode):
+        mask = byNode == node
+        result["nodes"]["node" + str(node)] = describe(latencies[mask], times[mask])
+
+    for sender, receiver in sorted(set(zip(senders.tolist(), receivers.tolist()))):
+        mask = (senders == sender) & (receivers == receiver)
+        name = streamName + str(sender) + "-" + str(receiver)
+        result["streams"][name] = describe(latencies[mask], times[mask])
+
+    return result
+
+
+def analyze(directory):
+    """
+    Returns publish and end-to-end latency of a test run, None if JMeter wrote no results
+    """
+    if not os.path.isfile(directory + "/" + RESULTS):
+        return None
+    runParams = catalog.loadParams(directory)
+    streamName = runParams.streamName
+    start, elapsed, success, senders, receivers, keys = readResults(directory, streamName)
+
+    publish = breakdown(elapsed[success], start[success], senders[success], receivers[success],
+                        senders[success], streamName)
+    publish["all"]["success"] = round(float(success.mean()), 4) if len(success) else None
+    result = {"publish": publish}
+
+    if not getattr(runParams, "latencyMode", False):
+        return result
+    try:
+        received = runData.load(directory, "received")
+    except (FileNotFoundError, ValueError):
+        return result
+
+    # match each received item to its publish request by sender, receiver and key
+    published = encode(senders[success], receivers[success], keys[success])
+    order = np.argsort(published)
+    published, publishedAt = published[order], start[success][order]
+
+    items = encode(received[:, 0].astype(np.int64), received[:, 1].astype(np.int64), received[:, 2].astype(np.int64))
+    index = np.minimum(np.searchsorted(published, items), max(len(published) - 1, 0))
+    matched = (published[index] == items) if len(published) else np.zeros(len(items), dtype=bool)
+
+    seen = received[matched, 3]
+    itemSenders, itemReceivers = received[matched, 0].astype(int), received[matched, 1].astype(int)
+    result["endToEnd"] = breakdown(seen - publishedAt[index[matched]], seen, itemSenders, itemReceivers,
+                                   itemReceivers, streamName)
+    result["endToEnd"]["all"]["lost"] = int(len(published) - np.unique(items[matched]).size)
+    return result
+
+
+def printReport(result):
+    def line(name, summary):
+        values = [str(summary["count"]) + " tx"]
+        values += [key + " " + str(summary[key]) + " ms" for key in ["p50", "p95", "p99"] if key in summary]
+        if summary["txPerSecond"] is not None:
+            values.append(str(summary["txPerSecond"]) + " tx/s")
+        print ("  " + name + ": " + ", ".join(values))
+
+    for kind, title in [("publish", "Publish latency"), ("endToEnd", "End-to-end latency")]:
+        if kind not in result:
+            continue
+        print (title + ":")
+        line("all", result[kind]["all"])
+        for group in ["nodes", "streams"]:
+            for name, summary in result[kind][group].items():
+                line(name, summary)
+
+    if "success" in result["publish"]["all"]:
+        print ("Publish success rate: " + str(result["publish"]["all"]["success"]))
+    if "endToEnd" in result:
+        print ("Items never seen by their receiver: " + str(result["endToEnd"]["all"]["lost"]))
+
+
+def report(directory):
+    """
+    Analyzes throughput and latency of a test run, writes them to latency.json and prints them
+    """
+    result = analyze(directory)
+    if result is None:
+        print ("No JMeter results in " + directory)
+        return None
+    with open(directory + "/" + REPORT, "w") as outfile:
+        json.dump(result, outfile, indent=4)
+    printReport(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reports throughput and latency of test runs")
+    parser.add_argument("directories", nargs="+", help="test directories to analyze")
+    args = parser.parse_args(argv)
+
+    for directory in args.directories:
+        print (directory)
+        report(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Native load generator, an alternative to JMeter (params.loadGenerator = "native")
+
+Usage: python loadgen.py directory
+
+Publishes the transactions of a test run as described by the copy of params.py in its directory:
+txpm[sender][receiver] transactions per minute from each sender to the stream of each receiver,
+for testDuration minutes, with payloads of the size of their stream (txSizes) from a pre-generated
+pool (see payloads.py). Requests are sent with asyncio over a pool of keep-alive http connections
+per sending node, so a single process can publish thousands of transactions per second.
+
+Open loop (default): transactions are sent at scheduled times regardless of how long earlier ones
+take, with fixed, Poisson (exponential) or Gaussian (standard deviation sigma) times in between.
+Closed loop (closedLoop): loadConcurrency transactions per stream are outstanding at any time,
+each followed by a pause drawn from the same distribution before the next one is sent.
+
+Every request is written to results.jtl in the same csv format as JMeter's, so latency.py works
+for both. The additional column lag is how late (ms) a transaction was sent in open loop
+"""
+
+from base64 import b64encode
+from math import ceil
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import csv
+import signal
+import time
+
+import numpy as np
+
+from helpers import getTxSizes
+import catalog
+import latency
+import payloads
+
+
+KEYS = (1000000000, 2147483648)     # range of the random keys, like the uuid in the JMeter testplan
+FIELDS = ["timeStamp", "elapsed", "label", "responseCode", "success", "streamname", "uuid", "lag"]
+
+
+class RpcPool:
+    """
+    Pool of at most size keep-alive http connections to the rpc port of a node
+    """
+
+    def __init__(self, host, port, authorization, size):
+        url = urlsplit(host)
+        self.host, self.port, self.ssl = url.hostname, port, url.scheme == "https"
+        self.head = ("POST / HTTP/1.1\r\nHost: " + url.hostname + ":" + str(port) + "\r\n" +
+                     "Authorization: " + authorization + "\r\nContent-Type: application/json\r\n" +
+                     "Connection: keep-alive\r\nContent-Length: ").encode("ascii")
+        # a slot per connection that may be in use, freed when a connection is returned or discarded,
+        # so a request waiting for a slot opens a new connection once a broken one was discarded
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def acquire(self):
+        await self.slots.acquire()
+        if self.idle:
+            return self.idle.pop()
+        try:
+            return await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection):
+        self.idle.append(connection)
+        self.slots.release()
+
+    def discard(self, connection):
+        connection[1].close()
+        self.slots.release()
+
+    async def post(self, parts):
+        """
+        Posts a request body given as a list of bytes, returns the http status code of the response
+        """
+        connection = await self.acquire()
+        reader, writer = connection
+        try:
+            writer.writelines([self.head, str(sum(len(part) for part in parts)).encode("ascii"), b"\r\n\r\n"] + parts)
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length, close = 0, False
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.partition(b":")
+                name = name.strip().lower()
+                if name == b"content-length":
+                    length = int(value)
+                elif name == b"connection":
+                    close = value.strip().lower() == b"close"
+            await reader.readexactly(length)
+
+        except BaseException:
+            # also when cancelled by a timeout, the connection is in an unknown state
+            self.discard(connection)
+            raise
+
+        if close:
+            self.discard(connection)
+        else:
+            self.release(connection)
+        return status
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
+
+
+def authorization(chain):
+    """
+    Value of the basic authorization header for the rpc credentials of the chain
+    """
+    credentials = chain["all"]["RPC_USER"] + ":" + chain["all"]["RPC_PASSWORD"]
+    return "Basic " + b64encode(credentials.encode("utf-8")).decode("ascii")
+
+
+def intervals(rate, count, arrivals, sigma, rng):
+    """
+    Returns count times (s) between transactions sent at rate transactions per minute
+    arrivals is "fixed", "poisson" (exponentially distributed) or "gaussian" (standard deviation sigma ms)
+    """
+    mean = 60 / rate
+    if arrivals == "fixed":
+        return np.full(count, mean)
+    elif arrivals == "poisson":
+        return rng.exponential(mean, count)
+    elif arrivals == "gaussian":
+        return np.maximum(rng.normal(mean, sigma / 1000, count), 0)
+    raise ValueError("unknown arrivals " + str(arrivals))
+
+
+class LoadGenerator:
+    """
+    Publishes the transactions of a test run, see the module docstring
+    """
+
+    def __init__(self, params, outfile, seed=None):
+        self.params = params
+        self.rng = np.random.default_rng(seed)
+        self.streams = []
+        for sender in range(params.numNodes):
+            for receiver in range(params.numNodes):
+                if params.txpm[sender][receiver] > 0 and sender != receiver:
+                    self.streams.append((sender, receiver, params.streamName + str(sender) + "-" + str(receiver)))
+
+        # one pool per transaction size, the key is prepended to the data twice like in the JMeter testplan
+        sizes, pools = getTxSizes(params), {}
+        self.payloads = {}
+        for sender, receiver, name in self.streams:
+            size = sizes[sender][receiver]
+            if size not in pools:
+                pools[size] = payloads.fromParams(params, reserved=20, rng=self.rng, txSize=size)
+            self.payloads[name] = pools[size]
+        self.tail = b'","' + (b"offchain" if params.offchain else b"") + b'"]}'
+
+        self.writer = csv.writer(outfile)
+        self.writer.writerow(FIELDS)
+        self.pools = {}
+        self.stopped = False
+
+    def pool(self, node):
+        if node not in self.pools:
+            self.pools[node] = RpcPool(self.params.host, self.params.rpcPorts[node],
+                                       authorization(self.params.chain), self.params.loadConnections)
+        return self.pools[node]
+
+    async def publish(self, sender, name, scheduled):
+        key = str(int(self.rng.integers(*KEYS))).encode("ascii")
+        parts = [b'{"method":"publish","params":["' + name.encode("ascii") + b'","', key, b'","', key, key, self.payloads[name].take(), self.tail]
+
+        start = time.time()
+        lag = max(time.monotonic() - scheduled, 0) if scheduled is not None else 0
+        try:
+            code = await asyncio.wait_for(self.pool(sender).post(parts), self.params.rpcTimeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as error:
+            code = type(error).__name__
+        elapsed = time.time() - start
+
+        self.writer.writerow([int(start * 1000), int(elapsed * 1000), "Publish-node" + str(sender), code,
+                              "true" if code == 200 else "false", name, key.decode("ascii"), int(lag * 1000)])
+
+    async def openLoop(self, sender, name, times):
+        """
+        Sends each transaction at its scheduled time (monotonic clock) without waiting for earlier ones
+        """
+        pending = set()
+        for scheduled in times:
+            if self.stopped:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.publish(sender, name, scheduled))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def closedLoop(self, sender, name, pauses):
+        """
+        Keeps loadConcurrency transactions outstanding, pausing after each response
+        """
+        pauses = iter(pauses)
+
+        async def worker():
+            for pause in pauses:
+                if self.stopped:
+                    break
+                await self.publish(sender, name, None)
+                await asyncio.sleep(pause)
+
+        await asyncio.gather(*(worker() for _ in range(self.params.loadConcurrency)))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, self.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        params = self.params
+        start = time.monotonic()
+        runs = []
+        for sender, receiver, name in self.streams:
+            rate = params.txpm[sender][receiver]
+            waits = intervals(rate, ceil(rate * params.testDuration), params.arrivals, params.sigma, self.rng)
+            if params.closedLoop:
+                runs.append(self.closedLoop(sender, name, waits))
+            else:
+                runs.append(self.openLoop(sender, name, start + np.cumsum(waits)))
+
+        try:
+            await asyncio.gather(*runs)
+        finally:
+            for pool in self.pools.values():
+                pool.close()
+
+    def stop(self):
+        """
+        Stops sending further transactions, outstanding ones are still recorded
+        """
+        self.stopped = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publishes the transactions of a test run")
+    parser.add_argument("directory", help="test directory with the copy of params.py of the run")
+    parser.add_argument("--seed", type=int, help="seed of the random keys, data and arrival times")
+    args = parser.parse_args()
+
+    params = catalog.loadParams(args.directory)
+    with open(args.directory + "/" + latency.RESULTS, "w", newline="", buffering=1 << 16) as outfile:
+        generator = LoadGenerator(params, outfile, args.seed)
+        asyncio.run(generator.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@
 Parameters for benchmark.py
 """
 from base64 import b64encode
-import random
 import numpy as np
 
 
@@ -28,14 +27,37 @@ else:
 
 offchain = True                 # whether stream items are published offchain or onchain
 diskSpaceDetailed = True        # whether to measure detailed disk usage by nodes
+diskAgent = True                # whether disk usage is tracked by an agent in each container instead of du
+telemetry = True                # whether CPU, memory, block I/O and network usage of the containers are measured
 masterSubAll = True             # whether master node should subscribe to all streams
 streamName = "stream"           # basis, sender-receiver will be appended, e.g. stream0-1
 
 txSize = 128                    # KB, shared transaction size (1.53KB would be the average)
+txSizes = None                  # KB, matrix of mean transaction sizes by sender (row) and receiver (column) like txpm,
+                                # replaces txSize for each pair if given, e.g. [[0, 1.5, 64], [128, 0, 1.5], ...]
+txSizeSpread = 0                # native: relative standard deviation of transaction sizes around their mean (lognormal), 0: fixed
+payloadEntropy = 1.0            # fraction of the data of each transaction that is random, the rest compresses well
+payloadPool = 256               # native: number of distinct payloads the load generator cycles through
+                                # JMeter sends a single payload per run (or per stream with txSizes) and ignores both
 sigma = 1500                    # ms, shared standard deviation of time between transaction, MUST BE NONZERO
 testDuration = 600              # min, duration until test terminates
 plotDuration = [0, 365]         # days, duration for which approximate values are plotted (if 0, actual test data)
 measureDelay = 5                # s, time between measurements
+sampleWorkers = 32              # number of threads probing nodes concurrently during a measurement
+sinkBackend = "csv"             # how measurements are stored: "csv", "binary" or "sqlite"
+flushInterval = 30              # s, time after which buffered measurements are synced to disk
+statusInterval = 300            # s, time between printouts of the current slopes during the test
+earlyStop = False               # whether to stop the test as soon as the slopes of all nodes converged
+earlyStopTolerance = 0.05       # maximum width of the 95% confidence interval of a slope, relative to the slope
+earlyStopFloor = 0.01           # KB/s, slopes below this (e.g. idle nodes) are compared against it instead
+minTestDuration = 30            # min, minimum duration of the test before it is stopped early
+latencyMode = False             # whether to also measure when published items become visible on their receivers
+latencyInterval = 1             # s, time between polls of the receivers for new items in latency mode
+loadGenerator = "jmeter"        # what publishes the transactions: "jmeter" or "native" (loadgen.py)
+arrivals = "gaussian"           # native: time between transactions, "fixed", "poisson" or "gaussian" (with sigma)
+closedLoop = False              # native: whether streams wait for responses instead of sending at scheduled times
+loadConcurrency = 1             # native, closed loop: number of outstanding transactions per stream
+loadConnections = 16            # native: maximum number of keep-alive connections to each sending node
 
 
 """
@@ -43,6 +65,12 @@ To set up a local network in docker containers:
 """
 
 host = "this-is-incorrect-replace-this"                 # host address on which docker containers are running
+rpcTimeout = 10                                         # s, timeout of rpc calls to the nodes
+rpcRetries = 3                                          # number of retries of rpc calls that failed to connect
+setupTimeout = 300                                      # s, maximum time to wait for the network during setup
+pollInterval = 1                                        # s, time between checks whether the network is ready
+readyStable = 10                                        # s, time a node must stay reachable and connected to count as ready
+keepWarm = False                                        # whether to keep the network running and reset it to a snapshot between runs
 
 if offchain:
     directory = "data/testfiles-offchain"               # directory in which to store results
@@ -55,6 +83,9 @@ else:
     rpcPorts = [8012, 8013, 8014, 8015, 8016]
     containerName = "node-on"
 
+composeFile = "docker-compose.yml"                      # docker-compose file describing the network
+composeProject = "multichain-benchmark"                 # docker-compose project name of the network
+
 chain = {
     "master": {                                         # specify parameters for blockchain here, e.g.
         "PARAM_ANYONE_CAN_CONNECT": "anyone-can-connect|true",
@@ -73,3 +104,6 @@ chain = {
 # generate header from username and password, DON'T CHANGE THIS
 header = {"Authorization": "Basic " + b64encode(bytes(chain["all"]["RPC_USER"] +
           ":" + chain["all"]["RPC_PASSWORD"], "utf-8")).decode("ascii")}
+
+# values that replace the ones above for a single run, set by sweep.py and appended to the saved copy
+overrides = {}
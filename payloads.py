@@ -0,0 +1,86 @@
+"""
+Pool of pre-generated payloads for the transactions of a test
+
+All payloads are generated once into a single anonymous memory-mapped buffer before the test starts,
+and handed out in turn as zero-copy memoryview slices, so publishing a transaction costs no
+allocation or copying of its data regardless of txSize.
+
+Payloads are hex digits (as published to MultiChain streams) and differ from each other:
+- their sizes follow a lognormal distribution with mean txSize (or the size of their stream, see
+  txSizes) and relative standard deviation txSizeSpread (all the mean if the spread is 0)
+- a fraction payloadEntropy of each payload is random, the rest is made of runs of zeros, so
+  payloads with low entropy compress well
+"""
+
+from math import ceil, log, sqrt
+import mmap
+
+import numpy as np
+
+
+HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+CHUNK = 64                  # hex digits, granularity at which payloads are random or compressible
+BLOCK = 1 << 24             # hex digits generated at once
+
+
+def payloadSizes(txSize, spread, count, rng):
+    """
+    Returns the sizes (KB) of count transactions with mean txSize and relative standard deviation spread
+    """
+    if spread <= 0:
+        return np.full(count, float(txSize))
+    variance = log(1 + spread ** 2)
+    return rng.lognormal(log(txSize) - variance / 2, sqrt(variance), count)
+
+
+class PayloadPool:
+    """
+    count distinct payloads of the given sizes (KB), each shortened by reserved hex digits
+    (e.g. for the keys prepended to the data)
+    """
+
+    def __init__(self, sizes, entropy=1.0, reserved=0, rng=None):
+        rng = rng or np.random.default_rng()
+
+        # hex digits of each payload, always an even number so the data stays valid hex
+        lengths = np.maximum(np.ceil(np.asarray(sizes) * 1024).astype(np.int64) * 2 - reserved, 0)
+        lengths -= lengths % 2
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.buffer = mmap.mmap(-1, max(int(self.offsets[-1]), 1))
+        self.view = memoryview(self.buffer)
+        digits = np.frombuffer(self.buffer, dtype=np.uint8)
+
+        for start in range(0, int(self.offsets[-1]), BLOCK):
+            block = digits[start:start + BLOCK]
+            block[:] = HEX[rng.integers(0, 16, len(block), dtype=np.uint8)]
+
+            # replace chunks by zeros with probability 1 - entropy
+            if entropy < 1:
+                chunks = rng.random(ceil(len(block) / CHUNK)) >= entropy
+                block[np.repeat(chunks, CHUNK)[:len(block)]] = ord("0")
+
+        self.count = len(lengths)
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.view[self.offsets[i]:self.offsets[i + 1]]
+
+    def take(self):
+        """
+        Returns the next payload, cycling through the pool
+        """
+        payload = self[self.next]
+        self.next = (self.next + 1) % self.count
+        return payload
+
+
+def fromParams(params, reserved=0, rng=None, txSize=None):
+    """
+    Returns the pool of payloads described by params, with mean size txSize (KB) if given instead of params.txSize
+    """
+    rng = rng or np.random.default_rng()
+    sizes = payloadSizes(txSize or params.txSize, params.txSizeSpread, params.payloadPool, rng)
+    return PayloadPool(sizes, params.payloadEntropy, reserved, rng)
@@ -0,0 +1,160 @@
+"""
+What-if capacity planning over many transaction matrices at once
+
+Usage: python planner.py scenarios.json [--offchain y/n] [--txsize 64] [--top 10]
+
+Learns a weighted linear model of the growth of disk space of a node from its features (KB sent,
+received and otherwise in the network per minute, see predictDiskUsage.getData) from all finished
+runs in the catalog, and applies it to a stack of scenarios in a single vectorized call:
+
+    model = learn(offchain=True)
+    plan = predict(model, txpm, sizes)      # txpm: scenarios x nodes x nodes, sizes broadcastable to it (KB)
+    order = rank(plan)                      # scenarios by their peak node, largest first
+
+plan.mean, plan.lower and plan.upper are GB per year per node (scenarios x nodes), the bounds form
+a prediction interval at the given level for a single node. Evaluating 100k scenarios of ten nodes takes
+well under a second.
+
+scenarios.json holds a list of scenarios, each a dict with party names as keys and transactions per
+year as values like tx in predictDiskUsage.py, or a dict with "txpy" (scenarios x parties) and
+optionally "sizes" (KB, per party or scenarios x parties) and "labels". Each party exchanges its
+transactions with an additional last node, see helpers.getTxpmStack
+"""
+
+from collections import namedtuple
+import argparse
+import json
+
+import numpy as np
+from scipy import stats
+
+from helpers import *
+
+
+# from KB per second to GB per year
+CONVERSION = (60 * 60 * 24 * 365.23) / (1024 * 1024)
+LEVEL = 0.95                # level of the prediction intervals
+TOP = 10                    # number of scenarios listed from the command line
+
+# weighted least squares fit of slope (KB/s) = coef[0] + coef[1:] . features (KB/min), with the
+# covariance of coef, the residual standard deviation of a node of average weight and the degrees of freedom
+Model = namedtuple("Model", ["coef", "covariance", "residual", "dof"])
+
+# GB per year per node of each scenario (scenarios x nodes)
+Plan = namedtuple("Plan", ["mean", "lower", "upper"])
+
+
+def fitModel(data):
+    """
+    Fits a Model to rows of features, target and weight as returned by predictDiskUsage.getTrainingData
+    """
+    data = np.asarray(data, dtype=float)
+    X, Y, w = data[:, :3], data[:, 3], data[:, 4]
+    keep = w > 0
+    X, Y, w = X[keep], Y[keep], w[keep] / w[keep].mean()
+
+    A = np.hstack((np.ones((X.shape[0], 1)), X))
+    dof = A.shape[0] - A.shape[1]
+    if dof < 1:
+        raise ValueError("not enough nodes to fit a model, got " + str(A.shape[0]))
+
+    # rank deficient designs (e.g. only runs with a single transaction matrix) still get a least squares solution
+    weighted = A * np.sqrt(w).reshape(-1, 1)
+    coef = np.linalg.lstsq(weighted, Y * np.sqrt(w), rcond=None)[0]
+    residual = np.sqrt(np.sum(w * (Y - A @ coef) ** 2) / dof)
+    covariance = residual ** 2 * np.linalg.pinv(weighted.T @ weighted)
+    return Model(coef, covariance, residual, dof)
+
+
+def learn(offchain=True, size=None):
+    """
+    Learns a Model from all finished runs in the catalog, only from runs with txSize size if given
+    """
+    import predictDiskUsage
+    return fitModel(predictDiskUsage.getTrainingData(offchain, size))
+
+
+def features(txpm, sizes):
+    """
+    Returns the features of each node of each scenario (scenarios x nodes x 3) in KB/min
+    txpm are transactions per minute (scenarios x nodes x nodes), sizes their mean size (KB), broadcastable to txpm
+    """
+    KBpm = np.asarray(txpm, dtype=float) * np.asarray(sizes, dtype=float)
+    sent = KBpm.sum(axis=2)
+    received = KBpm.sum(axis=1)
+    other = KBpm.sum(axis=(1, 2)).reshape(-1, 1) - sent - received
+    return np.stack((sent, received, other), axis=2)
+
+
+def predict(model, txpm, sizes, level=LEVEL):
+    """
+    Predicts the growth of disk space of each node of each scenario in GB per year, see Plan
+    """
+    X = features(txpm, sizes)
+    A = np.concatenate((np.ones(X.shape[:2] + (1,)), X), axis=2)
+
+    mean = A @ model.coef
+    spread = np.sqrt(model.residual ** 2 + np.einsum("snk,kl,snl->sn", A, model.covariance, A))
+    width = stats.t.ppf(0.5 + level / 2, model.dof) * spread
+    return Plan(mean * CONVERSION, (mean - width) * CONVERSION, (mean + width) * CONVERSION)
+
+
+def rank(plan, bound="upper"):
+    """
+    Returns the indices of the scenarios ordered by the disk usage of their peak node, largest first,
+    by the given field of the plan
+    """
+    return np.argsort(-np.max(getattr(plan, bound), axis=1), kind="stable")
+
+
+def readScenarios(path):
+    """
+    Returns labels, stacked txpm and sizes (KB, None for params.txSize) of the scenarios in a json file
+    """
+    with open(path) as infile:
+        scenarios = json.load(infile)
+
+    if isinstance(scenarios, list):
+        labels = sorted(set(label for scenario in scenarios for label in scenario))
+        txpy = [[scenario.get(label, 0) for label in labels] for scenario in scenarios]
+        sizes = None
+    else:
+        txpy = np.asarray(scenarios["txpy"], dtype=float)
+        labels = scenarios.get("labels", ["party" + str(i) for i in range(txpy.shape[1])])
+        sizes = scenarios.get("sizes")
+
+    txpm = getTxpmStack(txpy)
+    if sizes is not None:
+        # each sender with the size of its transactions, the additional node with the mean size
+        sizes = np.broadcast_to(np.asarray(sizes, dtype=float), (txpm.shape[0], len(labels)))
+        sizes = np.hstack((sizes, sizes.mean(axis=1, keepdims=True))).reshape(txpm.shape[:2] + (1,))
+    return labels + ["hub"], txpm, sizes
+
+
+def main(argv=None):
+    import params
+
+    parser = argparse.ArgumentParser(description="Predicts disk usage of many transaction scenarios")
+    parser.add_argument("scenarios", help="json file of scenarios, see planner.py")
+    parser.add_argument("--offchain", choices=["y", "n"], default="y", help="offchain or onchain model")
+    parser.add_argument("--txsize", type=float, help="only learn from runs with this transaction size")
+    parser.add_argument("--top", type=int, default=TOP, help="number of scenarios to list")
+    parser.add_argument("--level", type=float, default=LEVEL, help="level of the prediction intervals")
+    args = parser.parse_args(argv)
+
+    try:
+        model = learn(args.offchain == "y", args.txsize)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    labels, txpm, sizes = readScenarios(args.scenarios)
+    plan = predict(model, txpm, params.txSize if sizes is None else sizes, args.level)
+
+    print ("Scenarios by peak node (GB per year, " + str(round(args.level * 100)) + "% prediction interval):")
+    for s in rank(plan)[:args.top]:
+        peak = int(np.argmax(plan.upper[s]))
+        print ("  scenario " + str(s) + ": " + labels[peak] + " " + str(round(plan.mean[s, peak], 2)) +
+               " [" + str(round(plan.lower[s, peak], 2)) + ", " + str(round(plan.upper[s, peak], 2)) + "]")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 """
-Iff executed as main file, will ask for a directory within data/ and plot the measurements therein
+Iff executed as main file without arguments, will ask for a directory within data/ and plot the measurements therein
+With arguments, re-plots the given directories or all (filtered) runs in the catalog in parallel, e.g.
+python plotDiskUsage.py --all --offchain y --workers 8
+Runs whose plots are newer than their measurements and params, and were plotted with the same
+--resolution and --decimation, are skipped unless --force is given
 
 Plots total multichain disk usage for all nodes against time, plus the total tx and chain size,
 for time periods specified within the params.py file in the directory
@@ -7,23 +11,52 @@ for time periods specified within the params.py file in the directory
 If detailed disk space data exists, will also plot size of all multichain subfolders plus
 total tx and chain size against time for each node. Only real test data.
 
+If resource usage of the containers was measured (see telemetry.py), will also plot CPU load,
+memory against disk space, write amplification and network traffic of all nodes
+
 Is called by benchmark.py after test ends
 """
 
-import csv
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import importlib.util
+import json
+import os
 
-from sklearn import linear_model
 import matplotlib
 matplotlib.use("agg")
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
+from downsample import decimate
+from fitting import fitColumns
 from helpers import *
+import catalog
+import diskstore
+import runData
+import steadystate
+import telemetry
+
+
+RESOLUTION = 2000       # maximum number of points plotted per line
+DECIMATION = "lttb"     # how lines are reduced to RESOLUTION points: "lttb", "minmax" or None
+
+figure = None           # figure reused for all plots of this process
+
+
+def getFigure():
+    """
+    Returns the figure of this process, cleared for the next plot
+    """
+    global figure
+    if figure is None:
+        figure = plt.figure()
+    else:
+        figure.clf()
+    return figure
 
 
-def plotResults(directory):
+def plotResults(directory, resolution=RESOLUTION, decimation=DECIMATION):
     """
     Plots measurements with transaction volume and disk space usage on y-axis against time
     """
@@ -33,15 +66,8 @@ def plotResults(directory):
     params = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(params)
 
-    if params.offchain:
-        centerTime = 90
-    else:
-        centerTime = 600
-
-    startrow = round(centerTime / params.measureDelay)
-
     # read in data from measurements and format for linear regression / plotting
-    data = pd.read_csv(directory + "/measurements.csv", header=None).values
+    data = runData.measurements(directory)
     n, m = data.shape[0], data.shape[1]
     time = data[:, 0].reshape(n, 1)
 
@@ -49,6 +75,10 @@ def plotResults(directory):
     labels = ["chain size", "total size items"]
     labels += params.labels
 
+    # fit a line to all columns at once for the approximate continuation, each from the end of its warm-up
+    startrows = steadystate.startrows(directory)
+    fit = fitColumns(time, data[:, 1:], startrows)
+
     for plotDuration in params.plotDuration:
 
         # figure out what units to use for disk space and time
@@ -60,7 +90,7 @@ def plotResults(directory):
             timeUnit, timeConversionRate = getTime(endTime)
             sizeUnit, sizeConversionRate = getSize(np.amax(data[-1, 1:]) * endTime / params.testDuration)
 
-        fig = plt.figure()
+        fig = getFigure()
         ax = fig.add_subplot(111)
 
         finalTally = []
@@ -68,20 +98,18 @@ def plotResults(directory):
         for i in range(1, m):
 
             column = data[:, i].reshape(n, 1)
+            startrow = startrows[i-1]
 
             # plot actually measured data for the test duration
             if plotDuration == 0:
-                ax.plot(time * timeConversionRate, (column - column[startrow]) * sizeConversionRate, "-", label=labels[i-1], alpha=0.4)
+                x, y = decimate(time * timeConversionRate, (column - column[startrow]) * sizeConversionRate, resolution, decimation)
+                ax.plot(x, y, "-", label=labels[i-1], alpha=0.4)
                 ax.axvline(x = time[startrow] * timeConversionRate, alpha=0.5)
 
-            # train linear regression model on measured data and plot the approximate values for given time
+            # plot the approximate values for given time from the linear fit of the measured data
             else:
-                regr = linear_model.LinearRegression()
-                regr.fit(time[startrow:, :], column[startrow:, :])
-                # print("Coefficients for " + labels[i-1] + ": \n", regr.coef_)
-
-                timeEX = np.linspace(centerTime, endTime, num=500).reshape(500, 1)
-                columnEX = regr.predict(timeEX)
+                timeEX = np.linspace(time[startrow][0], endTime, num=500).reshape(500, 1)
+                columnEX = fit.intercept[i-1] + fit.slope[i-1] * timeEX
 
                 ax.plot(timeEX * timeConversionRate, columnEX * sizeConversionRate, "-", label=labels[i-1], alpha=0.4)
                 print (labels[i-1], round(columnEX[-1][0] * sizeConversionRate, 2))
@@ -97,67 +125,46 @@ def plotResults(directory):
 
 def prepDetailedData(directory, i):
     """
-    Takes raw data string accumulated from the test and processes it so it can be read by pandas
-    Writes out results in "diskspace0split.csv" etc.
+    Takes raw data strings accumulated by older test runs in "diskspace0.csv" etc. and converts them
+    into the detailed disk space store of the node, unless the test run already wrote the store
     """
-    data = pd.read_csv(directory + "/diskspace" + str(i) + ".csv", header=None).values
-
-    with open(directory + "/diskspace" + str(i) + "split.csv", "w") as outfile:
-        wr = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-
-        # get the header
-        header = ["time"]
-        firstRow = data[0][1].replace('\r\n','\t').split("\t")
-        for j in range(len(firstRow)):
-            if j % 2 == 1:
-                header.append(firstRow[j][18:])
-
-        wr.writerow(header)
+    if not diskstore.exists(directory, i):
+        diskstore.convertLegacy(directory, i)
 
-        for row in data:
-            raw = row[1].replace('\r\n','\t').split("\t")
-            newRow = [row[0]]
-            for j in range(len(raw)):
-                if j % 2 == 0 and j < len(raw) - 1:
-                    newRow.append(float(raw[j]))
-            wr.writerow(newRow)
 
-
-def plotDetailed(params, directory, i):
+def plotDetailed(params, directory, i, resolution=RESOLUTION, decimation=DECIMATION):
     """
     Plots detailed disk usage data for a given node by subfolders within the chain folder
     """
 
-    if params.offchain:
-        centerTime = 90
-    else:
-        centerTime = 600
-
-    startrow = round(centerTime / params.measureDelay)
-
-    df = pd.read_csv(directory + "/diskspace" + str(i) + "split.csv", header=0)
-    data = df.values
-    labels = list(df)
+    labels, data = diskstore.read(directory, i)
 
     n, m = data.shape[0], data.shape[1]
     time = data[:, 0].reshape(n, 1)
 
-    fig = plt.figure()
+    # first row after the warm-up of the node
+    startTime = steadystate.window(directory)["startTime"][2 + i]
+    startrow = min(int(np.searchsorted(data[:, 0], startTime)), n - 1)
+
+    fig = getFigure()
     ax = fig.add_subplot(111)
 
     timeUnit, timeConversionRate = getTime(time[-1])
-    sizeUnit, sizeConversionRate = getSize(np.amax(data[-1, 1:]))
+    sizeUnit, sizeConversionRate = getSize(np.nanmax(data[-1, 1:]))
 
     for j in range(1, m):
         if "stream" not in labels[j]:
             column = data[:, j].reshape(n, 1)
-            ax.plot(time * timeConversionRate, (column - column[startrow]) * sizeConversionRate, "-", label=labels[j], alpha=1)
+            x, y = decimate(time * timeConversionRate, (column - column[startrow]) * sizeConversionRate, resolution, decimation)
+            ax.plot(x, y, "-", label=labels[j], alpha=1)
 
-    items = pd.read_csv(directory + "/measurements.csv", header=None).values[:n, 2].reshape(n, 1)
-    ax.plot(time * timeConversionRate, (items - items[startrow]) * sizeConversionRate, "-", label="items", alpha=1)
+    items = runData.column(directory, "measurements", 2)[:n].reshape(n, 1)
+    x, y = decimate(time * timeConversionRate, (items - items[startrow]) * sizeConversionRate, resolution, decimation)
+    ax.plot(x, y, "-", label="items", alpha=1)
 
-    chainSize = pd.read_csv(directory + "/measurements.csv", header=None).values[:n, 1].reshape(n, 1)
-    ax.plot(time * timeConversionRate, (chainSize - chainSize[startrow]) * sizeConversionRate, "-", label="chainSize", alpha=1)
+    chainSize = runData.column(directory, "measurements", 1)[:n].reshape(n, 1)
+    x, y = decimate(time * timeConversionRate, (chainSize - chainSize[startrow]) * sizeConversionRate, resolution, decimation)
+    ax.plot(x, y, "-", label="chainSize", alpha=1)
 
     ax.set_xlabel("time elapsed in " + timeUnit)
     ax.set_ylabel(r"$\delta$ diskspace in " + sizeUnit)
@@ -166,7 +173,7 @@ def plotDetailed(params, directory, i):
     fig.savefig(directory + "/diskspace" + str(i) + ".png")
 
 
-def plotResultsDetailed(directory):
+def plotResultsDetailed(directory, resolution=RESOLUTION, decimation=DECIMATION):
 
     # import params of that test run
     spec = importlib.util.spec_from_file_location("params.py", directory + "/params.py")
@@ -178,12 +185,187 @@ def plotResultsDetailed(directory):
         if params.diskSpaceDetailed:
             for i in range(params.numNodes):
                 prepDetailedData(directory, i)
-                plotDetailed(params, directory, i)
+                plotDetailed(params, directory, i, resolution, decimation)
     except AttributeError:
         pass
 
 
-def main():
+def rate(time, counter):
+    """
+    Returns the rate of change per second of a cumulative counter between consecutive samples
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(counter) / np.diff(time)
+
+
+def plotTelemetry(directory, resolution=RESOLUTION, decimation=DECIMATION):
+    """
+    Plots the resource usage of the container of each node: CPU load and network traffic against time,
+    resident memory against the disk space of the node, and write amplification (bytes written to disk
+    per byte of disk space grown) against time
+    """
+    params = catalog.loadParams(directory)
+    usage = runData.load(directory, "telemetry")
+    data = runData.measurements(directory)
+    n = min(usage.shape[0], data.shape[0])
+    usage, data = np.asarray(usage[:n], dtype=float), np.asarray(data[:n], dtype=float)
+    width = len(telemetry.METRICS)
+
+    time = data[:, 0]
+    timeUnit, timeConversionRate = getTime(time[-1])
+    sizeUnit, sizeConversionRate = getSize(np.nanmax(data[-1, 3:]))
+
+    fig = getFigure()
+    cpu, memory = fig.add_subplot(221), fig.add_subplot(222)
+    amplification, network = fig.add_subplot(223), fig.add_subplot(224)
+
+    for i in range(data.shape[1] - 3):
+        node = usage[:, 1 + i * width:1 + (i + 1) * width]
+        label = params.labels[i] if i < len(params.labels) else "node" + str(i)
+
+        x, y = decimate(time[1:] * timeConversionRate, rate(time, node[:, 0]) * 100, resolution, decimation)
+        cpu.plot(x, y, "-", label=label, alpha=0.6)
+
+        x, y = decimate(data[:, 3 + i] * sizeConversionRate, node[:, 1] / 1024, resolution, decimation)
+        memory.plot(x, y, "-", label=label, alpha=0.6)
+
+        grown = data[:, 3 + i] - data[0, 3 + i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(grown > 0, (node[:, 3] - node[0, 3]) / grown, np.nan)
+        x, y = decimate(time * timeConversionRate, ratio, resolution, decimation)
+        amplification.plot(x, y, "-", label=label, alpha=0.6)
+
+        x, y = decimate(time[1:] * timeConversionRate, rate(time, node[:, 4] + node[:, 5]), resolution, decimation)
+        network.plot(x, y, "-", label=label, alpha=0.6)
+
+    cpu.set_xlabel("time elapsed in " + timeUnit)
+    cpu.set_ylabel("CPU in % of a core")
+    memory.set_xlabel("diskspace in " + sizeUnit)
+    memory.set_ylabel("resident memory in MB")
+    amplification.set_xlabel("time elapsed in " + timeUnit)
+    amplification.set_ylabel("KB written per KB of diskspace")
+    network.set_xlabel("time elapsed in " + timeUnit)
+    network.set_ylabel("network traffic in KB/s")
+    cpu.legend(loc=0, fontsize="small")
+
+    fig.tight_layout()
+    fig.savefig(directory + "/telemetry.png")
+
+
+def hasTelemetry(directory):
+    """
+    Whether the resource usage of the containers was measured during a run
+    """
+    try:
+        runData.load(directory, "telemetry")
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def plotFiles(directory):
+    """
+    Returns the files a run is plotted from and the plots it produces
+    """
+    params = catalog.loadParams(directory)
+    inputs = [directory + "/params.py", runData.source(directory, "measurements")[0]]
+    outputs = [directory + "/plot-" + str(plotDuration) + ".png" for plotDuration in params.plotDuration]
+
+    # detailed plots of older runs are plotted from their raw csv, which is converted into a store first
+    if getattr(params, "diskSpaceDetailed", False):
+        for i in range(params.numNodes):
+            legacy = directory + "/diskspace" + str(i) + ".csv"
+            inputs += [legacy] if os.path.isfile(legacy) else list(diskstore.paths(directory, i))
+            outputs.append(directory + "/diskspace" + str(i) + ".png")
+
+    if hasTelemetry(directory):
+        inputs.append(runData.source(directory, "telemetry")[0])
+        outputs.append(directory + "/telemetry.png")
+
+    return inputs, outputs
+
+
+def plotOptions(directory):
+    """
+    Returns the resolution and decimation a run was last plotted with, the defaults if not recorded
+    """
+    try:
+        with open(directory + "/" + runData.CACHEDIR + "/plot.json") as infile:
+            options = json.load(infile)
+        return options["resolution"], options["decimation"]
+    except (OSError, ValueError, KeyError):
+        return RESOLUTION, DECIMATION
+
+
+def upToDate(directory, resolution=RESOLUTION, decimation=DECIMATION):
+    """
+    Whether all plots of a run exist, are newer than everything they are plotted from and were
+    plotted with the given resolution and decimation
+    """
+    if plotOptions(directory) != (resolution, decimation):
+        return False
+    inputs, outputs = plotFiles(directory)
+    if not all(os.path.isfile(path) for path in outputs):
+        return False
+    return min(os.path.getmtime(path) for path in outputs) >= max(os.path.getmtime(path) for path in inputs)
+
+
+def plotRun(directory, force=False, resolution=RESOLUTION, decimation=DECIMATION):
+    """
+    Plots a single run unless its plots are up to date, returns whether it was plotted
+    The options are passed explicitly, as processes of the pool may not inherit the settings of main
+    """
+    if not force and upToDate(directory, resolution, decimation):
+        return False
+    plotResults(directory, resolution, decimation)
+    plotResultsDetailed(directory, resolution, decimation)
+    if hasTelemetry(directory):
+        plotTelemetry(directory, resolution, decimation)
+
+    os.makedirs(directory + "/" + runData.CACHEDIR, exist_ok=True)
+    with open(directory + "/" + runData.CACHEDIR + "/plot.json", "w") as outfile:
+        json.dump({"resolution": resolution, "decimation": decimation}, outfile)
+    return True
+
+
+def plotAll(directories, workers=None, force=False, resolution=RESOLUTION, decimation=DECIMATION):
+    """
+    Plots the given runs in parallel, one process per core by default
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(directory, pool.submit(plotRun, directory, force, resolution, decimation)) for directory in directories]
+        for directory, future in futures:
+            try:
+                print (directory + (" plotted" if future.result() else " up to date"))
+            except Exception as e:
+                print (directory + " failed: " + repr(e))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plots the measurements of test runs")
+    parser.add_argument("directories", nargs="*", help="test directories to plot")
+    parser.add_argument("--all", action="store_true", help="plot all runs in the catalog")
+    parser.add_argument("--offchain", choices=["y", "n"], help="only offchain or onchain runs")
+    parser.add_argument("--txsize", type=float, help="only runs with this transaction size")
+    parser.add_argument("--workers", type=int, help="number of processes, default one per core")
+    parser.add_argument("--force", action="store_true", help="also plot runs whose plots are up to date")
+    parser.add_argument("--resolution", type=int, default=RESOLUTION, help="maximum number of points per line")
+    parser.add_argument("--decimation", choices=["lttb", "minmax", "none"], default=DECIMATION,
+                        help="how lines are reduced to the resolution")
+    args = parser.parse_args(argv)
+
+    resolution = args.resolution
+    decimation = None if args.decimation == "none" else args.decimation
+
+    if args.all:
+        offchain = None if args.offchain is None else args.offchain == "y"
+        runs = catalog.query(offchain=offchain, txSize=args.txsize, status="done")
+        plotAll([run["directory"] for run in runs], args.workers, args.force, resolution, decimation)
+        return
+
+    if args.directories:
+        plotAll(args.directories, args.workers, args.force, resolution, decimation)
+        return
 
     # get directory
     offc = input("Offchain? y or n: ")
@@ -193,8 +375,10 @@ def main():
     else:
         direc = "data/testfiles-onchain"
 
-    plotResults(direc + "-" + num)
-    plotResultsDetailed(direc + "-" + num)
+    plotResults(direc + "-" + num, resolution, decimation)
+    plotResultsDetailed(direc + "-" + num, resolution, decimation)
+    if hasTelemetry(direc + "-" + num):
+        plotTelemetry(direc + "-" + num, resolution, decimation)
 
 if __name__ == "__main__":
     main()
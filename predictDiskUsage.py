@@ -3,12 +3,14 @@ Analyzes all test measurements in data/ to try and learn how disk space
 grows in relation to tx size and # tx
 
 The goal is to predict the growth of disk space for any node given a matrix of transactions
-and their size (constant for all tx), i.e. a function of disk space (KB)/time (s)
+and a matrix of their sizes (see getTxSizes), i.e. a function of disk space (KB)/time (s)
 
-We use the following as features (for each node):
-- # tx sent per minute * tx size
-- # tx received per minute * tx size
-- # tx in the network, neither sent nor received * tx size
+We use the following as features (for each node), summed over all pairs of sender and receiver:
+- KB sent per minute (# tx * tx size of the pair)
+- KB received per minute
+- KB per minute in the network, neither sent nor received
+
+Since the features are in KB/min, runs with different and mixed tx sizes can train a single model
 
 The target is the coefficient that describes the slope of the linear function of
 of disk space (KB)/time (s) - we learn it with simple linear regression from the test data
@@ -16,24 +18,28 @@ of disk space (KB)/time (s) - we learn it with simple linear regression from the
 We weigh each node (i.e. data point) by the length of the test as a rough indicator
 of the accuracy of the data
 
-Lastly, we run linear regression on these features and targets to find the optimal coefficients,
-where linreg was chosen rather arbitrarily. Other models may be interesting.
-
-Assumes reasonable size of test set
+Lastly, we run linear regression on these features and targets to find the optimal coefficients.
+Linear regression is compared against nonlinear models (see MODELS) by k-fold cross-validation,
+and the uncertainty of its coefficients is estimated by bootstrap resampling of the nodes. Both run
+in parallel on all cores (JOBS)
 """
 
-from math import ceil
-import os
-import random
-import string
+import argparse
 
-from sklearn import linear_model
+from joblib import Parallel, cpu_count, delayed
+from sklearn import ensemble, linear_model
+from sklearn.base import clone
 from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import GroupKFold
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import PolynomialFeatures
 import numpy as np
-import pandas as pd
-import importlib.util
 
+from fitting import fitRuns
 from helpers import *
+import catalog
+import runData
+import steadystate
 
 # which predictions to show
 APPROX = not True
@@ -41,9 +47,12 @@ LINREG = True
 
 # for training the lin reg model on past data
 OFFCHAIN = True          # whether to calculate coefficients for offchain or onchain
-MINTESTSET = 5           # minimum size of test set for linear regression
-TESTRATIO = 0.2          # ratio of test set to total elements
-txSize = 1.53            # if model should only train on specific transaction size, otherwise None
+FOLDS = 5                # folds of cross-validation, all nodes of a run are in the same fold
+BOOTSTRAP = 1000         # bootstrap samples for the confidence intervals of the coefficients, resampling whole runs
+CONFIDENCE = 0.95        # level of the confidence intervals
+JOBS = -1                # parallel jobs for cross-validation and bootstrap, -1 for all cores
+SEED = 0                 # seed of the bootstrap samples, None for a different one each time
+txSize = None            # if model should only train on specific transaction size, otherwise None
 
 # transactoins per year by party name for approximate prediction
 tx = {
@@ -52,37 +61,49 @@ tx = {
     "Orange Donkey" : 3000
 }
 
+# models compared by cross-validation, the first one is the one whose coefficients are reported
+MODELS = {
+    "linear": linear_model.LinearRegression(),
+    "quadratic": make_pipeline(PolynomialFeatures(2, include_bias=False), linear_model.LinearRegression()),
+    "forest": ensemble.RandomForestRegressor(n_estimators=200, min_samples_leaf=2, random_state=0),
+}
+
+# mean size (KB) of the transactions sent by each party, params.txSize for parties not listed, e.g. {"Red Horse": 1.53}
+sizes = {}
+
 
-def predictApproxDU(tx):
+def predictApproxDU(tx, sizes=None):
     """
     Approximately calculates expected disk use of nodes according to the following formula,
     in which:
-    tx = size of a transaction
-    spy = # tx sent per year by node
-    rpy = # tx received per year by node
-    txpy = # total tx sent by any node in network per year
+    spy = KB sent per year by node (# tx * their size)
+    rpy = KB received per year by node
+    txpy = KB sent by any node in network per year
 
-    offchain: growth of disk usage per year = 2 * spy * tx + rpy * tx +  0.4KB * txpy
-    onchain: growth of disk usage per year = txpy * tx * 1.1
+    offchain: growth of disk usage per year = 2 * spy + rpy +  0.4KB * # tx
+    onchain: growth of disk usage per year = txpy * 1.1
 
     Fairly accurate with large tx (i.e tx >= 64 KB) to around +/- 10%
     """
 
-    # matrix of transactions
+    # matrix of transactions and of KB per minute, each sender with the size of its transactions
     labels, txpm = getTxpm(tx)
+    sizes = sizes or {}
+    txSizes = np.array([sizes.get(label, params.txSize) for label in labels] + [params.txSize])
+    KBpm = txpm * txSizes.reshape(-1, 1)
 
     # offchain accommodates source data (i.e. items stored locally by the sender)
-    txpmOff = np.multiply(np.sum(txpm, axis=1), 2) + np.sum(txpm, axis=0)
-    txpmOn = np.sum(txpm)
+    txpmOff = np.multiply(np.sum(KBpm, axis=1), 2) + np.sum(KBpm, axis=0)
+    txpmOn = np.sum(KBpm)
 
-    # from transactions per minute to GB per year
-    conversionRate = params.txSize * (60 * 24 * 365.23) / (1024 * 1024)
+    # from KB per minute to GB per year
+    conversionRate = (60 * 24 * 365.23) / (1024 * 1024)
 
     # size of just items stored on disk
     GBpyOffBasic = np.multiply(txpmOff, conversionRate)
     GBpyOnBasic = txpmOn * conversionRate
     print ("GB per year onchain basic (shared): ", round(GBpyOnBasic, 2))
-    print ("GB per year per node offchain basic: ", np.round_(GBpyOffBasic, 2))
+    print ("GB per year per node offchain basic: ", np.round(GBpyOffBasic, 2))
 
     # adjustments for metadata etc.
     GBpyOff = np.add(GBpyOffBasic, 2)
@@ -92,41 +113,24 @@ def predictApproxDU(tx):
     print ("GB per year per node offchain: ", np.around(GBpyOff, 2))
 
 
-def getData(params, directory):
+def getData(params, data, coefs):
     """
-    Returns matrix of features, targets, and weights for all nodes in the given directory
+    Returns matrix of features, targets, and weights for all nodes of a run, given its measurements
+    and the slopes fitted to each of their columns
 
-    Features (X) are tx sent pm, tx received pm, and all other tx, all multiplied by txSize
+    Features (X) are KB sent pm, KB received pm, and all other KB pm, each tx weighted by the size of its pair
     Targets (Y) are linear regression coefficients for each node
     Weights (w) are the test durations
     """
-    txpm = np.array(params.txpm)
+    KBpm = np.array(params.txpm) * getTxSizes(params)
 
     # set node specific features
-    txSentPerMin = np.sum(txpm, axis=1)
-    txRecePerMin = np.sum(txpm, axis=0)
-    allTx = np.full((params.numNodes,), np.sum(txpm))
-    otherTx = np.subtract(np.subtract(allTx, txSentPerMin), txRecePerMin)
-
-    # read in measurements
-    data = pd.read_csv(directory + "/measurements.csv", header=None).values
-    n, m = data.shape[0], data.shape[1]
-    time = data[:, 0].reshape(n, 1)
-
-    if params.offchain:
-        centerTime = 90
-    else:
-        centerTime = 600
-
-    startrow = round(centerTime / params.measureDelay)
+    sentPerMin = np.sum(KBpm, axis=1)
+    recePerMin = np.sum(KBpm, axis=0)
+    allKB = np.full((params.numNodes,), np.sum(KBpm))
+    otherKB = np.subtract(np.subtract(allKB, sentPerMin), recePerMin)
 
-    # get coefficients for linear regression
-    coefs = []
-    for i in range(1, m):
-        column = data[:, i].reshape(n, 1)
-        regr = linear_model.LinearRegression()
-        regr.fit(time[startrow:, :], column[startrow:, :])
-        coefs.append(regr.coef_[0][0])
+    m = data.shape[1]
 
     # if master node is subscribed to all streams, it is an outlier and should not be counted
     if params.masterSubAll:
@@ -134,7 +138,7 @@ def getData(params, directory):
     else:
         num = 0
 
-    X = params.txSize * np.vstack((txSentPerMin, txRecePerMin, otherTx)).T[num:]
+    X = np.vstack((sentPerMin, recePerMin, otherKB)).T[num:]
     Y = np.array(coefs[2 + num:])
     w = np.full((m - 3 - num,), data[-1, 0])
 
@@ -143,83 +147,188 @@ def getData(params, directory):
     return data
 
 
-def learnFunction(data):
+def fitWeighted(model, X, Y, w):
     """
-    Given accumulated data from past test runs, prints best coefficients as well as mse and var
+    Fits a fresh copy of an sklearn model (or pipeline) with sample weights
     """
+    model = clone(model)
+    if isinstance(model, Pipeline):
+        model.fit(X, Y, **{model.steps[-1][0] + "__sample_weight": w})
+    else:
+        model.fit(X, Y, sample_weight=w)
+    return model
 
-    # so that train and test will be random-ish
-    np.random.shuffle(data)
 
-    # split data into features, targets, and weights
-    X, Y, w = np.hsplit(data, [3, 4])
-    Y, w = Y.reshape(Y.shape[0],), w.reshape(w.shape[0],)
-    print ("Number of elements: ", X.shape[0])
+def predictFold(model, X, Y, w, train, test):
+    """
+    Returns the predictions for the rows test of a model trained on the rows train
+    """
+    return fitWeighted(model, X[train], Y[train], w[train]).predict(X[test])
 
-    # split the data into training/testing sets
-    cut = min(MINTESTSET, ceil(TESTRATIO * data.shape[0]))
-    X_train, X_test = X[:-cut], X[cut:]
-    Y_train, Y_test = Y[:-cut], Y[cut:]
-    w = w[:-cut]
 
-    # train the model
-    regr = linear_model.LinearRegression()
-    regr.fit(X_train, Y_train, w)
+def crossValidate(X, Y, w, groups, folds=FOLDS, jobs=JOBS):
+    """
+    Returns the weighted mse (mean and standard deviation over k folds) and r2 of the out-of-fold
+    predictions of each model in MODELS, with all models and folds fitted in parallel
+    Rows of the same group (run) are never split between training and test set, as the nodes of a run
+    share their transactions, so a model is always tested on runs it hasn't seen
+    """
+    splits = list(GroupKFold(min(folds, len(np.unique(groups)))).split(X, Y, groups))
+    predictions = Parallel(n_jobs=jobs)(delayed(predictFold)(model, X, Y, w, train, test)
+                                        for model in MODELS.values() for train, test in splits)
+
+    scores = {}
+    for i, name in enumerate(MODELS):
+        y_pred = np.zeros_like(Y)
+        mse = []
+        for (_, test), fold in zip(splits, predictions[i * len(splits):(i + 1) * len(splits)]):
+            y_pred[test] = fold
+            mse.append(mean_squared_error(Y[test], fold, sample_weight=w[test]))
+        scores[name] = {"mse": float(np.mean(mse)), "mseStd": float(np.std(mse)),
+                        "r2": float(r2_score(Y, y_pred, sample_weight=w))}
+    return scores
+
+
+def bootstrapCoefficients(X, Y, w, samples):
+    """
+    Returns intercept and coefficients of the first model in MODELS for each bootstrap sample (rows of indices)
+    """
+    model = next(iter(MODELS.values()))
+    coefs = []
+    for sample in samples:
+        fitted = fitWeighted(model, X[sample], Y[sample], w[sample])
+        coefs.append(np.concatenate(([fitted.intercept_], fitted.coef_)))
+    return coefs
 
-    # make predictions using the testing set
-    y_pred = regr.predict(X_test)
 
-    coeffs = [round(elem, 5) for elem in regr.coef_]
-    print("Coeff for tx sent/min * tx size: ", coeffs[0])
-    print("Coeff for tx received/min * tx size: ", coeffs[1])
-    print("Coeff for total other tx/min * tx size: ", coeffs[2])
-    print("Mean squared error: ", mean_squared_error(Y_test, y_pred))
-    print("Variance score: ", r2_score(Y_test, y_pred))
+def resampleRuns(groups, count, rng):
+    """
+    Returns count bootstrap samples (arrays of row indices) that each draw as many runs as there are,
+    with replacement, and take all rows of every drawn run
+    The nodes of a run share their transactions, so runs rather than nodes are the independent units
+    """
+    members = [np.flatnonzero(groups == run) for run in np.unique(groups)]
+    return [np.concatenate([members[i] for i in rng.integers(0, len(members), len(members))]) for _ in range(count)]
 
 
-def predictFromData():
+def bootstrap(X, Y, w, groups, count=BOOTSTRAP, confidence=CONFIDENCE, jobs=JOBS, seed=SEED):
+    """
+    Returns the lower and upper bounds of the percentile confidence intervals of intercept and coefficients
+    of the first model in MODELS, fitted to count resamples of the runs (groups) in parallel
+    """
+    if count < 1:
+        raise ValueError("bootstrap needs at least one sample, got " + str(count))
+
+    samples = resampleRuns(groups, count, np.random.default_rng(seed))
+    parts = min(count, 4 * (cpu_count() if jobs < 0 else jobs))
+    chunks = [samples[i::parts] for i in range(parts)]
+    coefs = Parallel(n_jobs=jobs)(delayed(bootstrapCoefficients)(X, Y, w, chunk) for chunk in chunks)
+    coefs = np.array([coef for chunk in coefs for coef in chunk])
+
+    alpha = (1 - confidence) / 2
+    return np.quantile(coefs, alpha, axis=0), np.quantile(coefs, 1 - alpha, axis=0)
+
+
+def learnFunction(data, folds=FOLDS, count=BOOTSTRAP, jobs=JOBS):
+    """
+    Given accumulated data from past test runs, prints the coefficients of linear regression with their
+    confidence intervals, and compares it to the other MODELS by cross-validation
+    Returns the scores of all models and the fitted linear model with its intervals
+    """
 
-    # whether onchain or offchain
-    if OFFCHAIN:
-        direc = "data/testfiles-offchain"
+    # split data into features, targets, weights and runs, without rows of weight 0
+    data = data[data[:, 4] > 0]
+    X, Y, w = data[:, :3], data[:, 3], data[:, 4]
+    runs = data[:, 5] if data.shape[1] > 5 else np.arange(data.shape[0])
+    print ("Number of elements: ", X.shape[0])
+    if X.shape[0] < 3:
+        print ("Not enough elements to learn from")
+        return None
+
+    regr = fitWeighted(next(iter(MODELS.values())), X, Y, w)
+    if len(np.unique(runs)) < 2:
+        print ("Confidence intervals need at least two runs")
+        lower = upper = np.full(X.shape[1] + 1, np.nan)
     else:
-        direc = "data/testfiles-onchain"
+        lower, upper = bootstrap(X, Y, w, runs, count, CONFIDENCE, jobs)
+
+    level = str(round(CONFIDENCE * 100)) + "% CI"
+    names = ["Intercept", "Coeff for KB sent/min", "Coeff for KB received/min", "Coeff for total other KB/min"]
+    for name, coef, low, high in zip(names, np.concatenate(([regr.intercept_], regr.coef_)), lower, upper):
+        print(name + ": ", round(coef, 5), " " + level + " [" + str(round(low, 5)) + ", " + str(round(high, 5)) + "]")
+
+    if len(np.unique(runs)) < 2:
+        print("Cross-validation needs at least two runs")
+        return {"scores": None, "model": regr, "lower": lower, "upper": upper}
 
-    # if given a value, only learn coefficients for #tx, using data from given txSize
-    print (direc)
-    print ("txSize:", txSize)
+    scores = crossValidate(X, Y, w, runs, folds, jobs)
+    print("Cross-validation (" + str(min(folds, len(np.unique(runs)))) + " folds of whole runs):")
+    for name, score in scores.items():
+        print("  " + name + ": mean squared error ", round(score["mse"], 6), "+/-", round(score["mseStd"], 6),
+              ", variance score ", round(score["r2"], 4))
+    print("Best model: ", min(scores, key=lambda name: scores[name]["mse"]))
+
+    return {"scores": scores, "model": regr, "lower": lower, "upper": upper}
+
+
+def getTrainingData(offchain=OFFCHAIN, size=txSize):
+    """
+    Returns features, targets and weights of all nodes of all finished runs in the catalog (see getData),
+    followed by the number of their run, only of runs with the given txSize if given
+    Raises ValueError if no finished run matches
+    """
 
     # initialize initial row (with weight 0)
-    data = np.zeros((1,5))
+    data = np.zeros((1,6))
 
-    for i in range(1, 20):
+    runs = [(catalog.runParams(run), runData.measurements(run["directory"]), steadystate.startrows(run["directory"]))
+            for run in catalog.query(offchain=offchain, txSize=size, status="done")]
+    if not runs:
+        raise ValueError("no finished runs match the filter (offchain: " + str(offchain) + ", txSize: " + str(size) + ")")
+
+    # fit slopes of all columns of all runs at once, each from the end of its warm-up
+    fits = fitRuns([(measured[:, 0], measured[:, 1:], startrows) for _, measured, startrows in runs])
+
+    for run, ((params, measured, _), fit) in enumerate(zip(runs, fits)):
+        datap = getData(params, measured, fit.slope)
+        data = np.vstack((data, np.hstack((datap, np.full((datap.shape[0], 1), run)))))
+
+    return data
 
-        directory = direc + "-" + str(i)
 
-        # check if directory exists
-        if os.path.isdir(directory):
+def predictFromData(offchain=OFFCHAIN, size=txSize, folds=FOLDS, count=BOOTSTRAP, jobs=JOBS):
 
-            # import params from the given directory
-            spec = importlib.util.spec_from_file_location("params.py", directory + "/params.py")
-            params = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(params)
+    # if given a value, only learn coefficients from runs with the given txSize, otherwise from all runs
+    print ("offchain:", offchain)
+    print ("txSize:", size)
 
-            if txSize == None or txSize == params.txSize:
-                datap = getData(params, directory)
-                data = np.vstack((data, datap))
+    learnFunction(getTrainingData(offchain, size), folds, count, jobs)
 
-    learnFunction(data)
 
+def main(argv=None):
 
-def main():
+    parser = argparse.ArgumentParser(description="Learns how disk space grows from past test runs")
+    parser.add_argument("--offchain", choices=["y", "n"], help="learn from offchain or onchain runs")
+    parser.add_argument("--txsize", type=float, help="only learn from runs with this transaction size")
+    parser.add_argument("--approx", action="store_true", default=APPROX, help="also show the rough formula")
+    parser.add_argument("--no-linreg", dest="linreg", action="store_false", default=LINREG,
+                        help="don't learn from past data")
+    parser.add_argument("--folds", type=int, default=FOLDS, help="folds of cross-validation")
+    parser.add_argument("--bootstrap", type=int, default=BOOTSTRAP, help="bootstrap samples for confidence intervals")
+    parser.add_argument("--jobs", type=int, default=JOBS, help="parallel jobs, -1 for all cores")
+    args = parser.parse_args(argv)
 
-    if LINREG:
+    if args.linreg:
         print ("\nPredictions from past data:")
-        predictFromData()
+        offchain = OFFCHAIN if args.offchain is None else args.offchain == "y"
+        try:
+            predictFromData(offchain, txSize if args.txsize is None else args.txsize, args.folds, args.bootstrap, args.jobs)
+        except ValueError as error:
+            raise SystemExit(str(error))
 
-    if APPROX:
+    if args.approx:
         print ("\nPredictions based on rough formula:")
-        predictApproxDU(tx)
+        predictApproxDU(tx, sizes)
 
 
 if __name__ == "__main__":
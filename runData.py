@@ -0,0 +1,86 @@
+"""
+Shared loader for the measurements of test runs, used by plotDiskUsage, predictDiskUsage and catalog
+
+Each table is parsed once and cached as a column-major .npy sidecar in the .cache/ subdirectory of the
+test directory, keyed on the size and modification time of its source. Later loads memory-map the
+sidecar, so slicing a column only reads that column from disk. Tables written by the binary sink
+backend are memory-mapped directly
+"""
+
+import json
+import os
+
+import numpy as np
+
+from sinks import readRecords, readTable
+
+
+CACHEDIR = ".cache"
+
+loaded = {}         # (directory, name) -> (key of the source, memory-mapped array)
+
+
+def source(directory, name):
+    """
+    Returns the file a table is stored in and whether it is a raw binary table
+    """
+    for path, binary in [(directory + "/" + name + ".csv", False),
+                         (directory + "/" + name + ".dat", True),
+                         (directory + "/measurements.db", False)]:
+        if os.path.isfile(path):
+            return path, binary
+    raise FileNotFoundError("no table " + name + " in " + directory)
+
+
+def sourceKey(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load(directory, name):
+    """
+    Returns a read-only, memory-mapped (rows x columns) array of the given table of a test run
+    """
+    path, binary = source(directory, name)
+    key = sourceKey(path)
+
+    if (directory, name) in loaded and loaded[(directory, name)][0] == key:
+        return loaded[(directory, name)][1]
+
+    if binary:
+        data = readRecords(path)[1]
+
+    else:
+        cache = directory + "/" + CACHEDIR + "/" + name
+        try:
+            with open(cache + ".json") as infile:
+                fresh = json.load(infile)["source"] == key
+        except (OSError, ValueError, KeyError):
+            fresh = False
+
+        # parse the source only if it changed since the sidecar was written
+        if not fresh:
+            os.makedirs(directory + "/" + CACHEDIR, exist_ok=True)
+            np.save(cache + ".npy", np.asfortranarray(readTable(directory, name), dtype=float))
+            with open(cache + ".json", "w") as outfile:
+                json.dump({"source": key}, outfile)
+
+        data = np.load(cache + ".npy", mmap_mode="r")
+
+    loaded[(directory, name)] = (key, data)
+    return data
+
+
+def column(directory, name, j):
+    """
+    Returns column j of the given table of a test run, reading only that column
+    """
+    return load(directory, name)[:, j]
+
+
+def measurements(directory):
+    """
+    Returns the measurements of a test run:
+    [elapsed time (s), chain growth (KB), size of items (KB), disk space node0 (KB), ...] per row
+    """
+    return load(directory, "measurements")
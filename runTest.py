@@ -9,29 +9,41 @@ Saves csv + plots + params in new directory under data/
 
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
 import copy
 import csv
 import os
-import random
-import string
+import signal
 import subprocess
+import sys
 import time
 import xml.etree.ElementTree as ET
 
 import numpy as np
 import yaml
 
+from diskstore import DiskStore
+from fitting import OnlineFit, converged
+from health import waitForConfirmations, waitForNodes
 from helpers import *
+from sampler import Sampler
+from sinks import closeAll, installSignalHandlers, openTable
+import catalog
+import latency
 import params
-import plotDiskUsage
+import payloads
+import steadystate
+import telemetry
+import warm
 
 
-def writeYamlFile():
+def writeYamlFile(snapshot=False):
     """
     Takes masternode and slavenode as defined in docker-compose-template.yml and the number of nodes n
-    Outputs docker-compose.yml file for a multichain network with masternode and n-1 slave nodes
+    Outputs docker-compose file (params.composeFile) for a multichain network with masternode and n-1 slave nodes
     as specified by the parameters in params.py
+    If snapshot is set, the nodes are created from their snapshots instead of the built images
     """
 
     # load docker-compose template
@@ -44,8 +56,10 @@ def writeYamlFile():
         if i == 0:
             node = basis["masternode"].copy()
             node["environment"] = {**node["environment"], **params.chain["master"]}
+            node["image"] = warm.imageTag("master")
         else:
             node = basis["slavenode"].copy()
+            node["image"] = warm.imageTag("node")
             node["environment"]["MASTER_NODE"] = params.containerName + str(0)
             node["links"] = [params.containerName + str(0)]
             node["depends_on"] = [params.containerName + str(0)]
@@ -55,32 +69,67 @@ def writeYamlFile():
         node["ports"] = [str(params.networkPorts[i]) + ":" + str(params.chain["all"]["NETWORK_PORT"]),
                          str(params.rpcPorts[i])     + ":" + str(params.chain["all"]["RPC_PORT"])]
 
+        if snapshot:
+            node["image"] = warm.snapshotTag(i)
+            del node["build"]
+
         compose["services"][params.containerName + str(i)] = node
 
     # create the docker-compose file
-    with open("docker-compose.yml", "w") as outfile:
+    with open(params.composeFile, "w") as outfile:
         yaml.dump(compose, outfile, default_flow_style=False)
 
 
 def startNodes():
     """
-    Builds the images and brings the network up as defined in docker-compose.yml as a background process
+    Builds the images and brings the network up as defined in the docker-compose file as a background process
+    Images are only built if the templates changed. With keepWarm, a running network is reset to
+    its snapshot of a fresh chain instead, or such a snapshot is taken if there is none yet
     Masternode sends empty transactions to  avoid "Error no unspent transaction outputs"
     """
-    subprocess.call("docker-compose down", shell=True)
-    subprocess.call("docker-compose build", shell=True)
-    subprocess.call("docker-compose up -d", shell=True)
+    start = time.time()
+
+    if params.keepWarm and warm.hasSnapshot():
+        print ("Resetting warm network to fresh chain ...")
+        writeYamlFile(snapshot=True)
+        compose("up -d --force-recreate")
+        latencies = waitForNodes(start)
+
+    else:
+        compose("down")
+        if not warm.imagesBuilt():
+            compose("build")
+        start = time.time()
+        compose("up -d")
+
+        # wait until the multichain network has initialized properly
+        latencies = waitForNodes(start)
+        if params.keepWarm:
+            warm.takeSnapshot()
+            waitForNodes(time.time())
 
-    # give multichain network time to initialize properly
-    time.sleep(30)
+    for i, latency in enumerate(latencies):
+        print ("Node " + str(i) + " ready after " + str(round(latency, 1)) + " s")
 
     # masternode sends empty transactions to all other sender nodes
     print ("Activating nodes ...")
-    for i in range(1, params.numNodes):
-        if sum(params.txpm[i]) > 0:
-            address = post(i, {"method": "getaddresses"}).json()["result"][0]
-            sendEmpty = {"method": "send", "params": [address, 0]}
-            post(0, sendEmpty)
+    senders = [i for i in range(1, params.numNodes) if sum(params.txpm[i]) > 0]
+    addresses = [rpc(i, "getaddresses")[0] for i in senders]
+    txids = batch(0, [("send", [address, 0]) for address in addresses])
+    waitForConfirmations(0, txids, "activation of nodes")
+    print ("Network ready after " + str(round(time.time() - start, 1)) + " s")
+
+
+def pairedStreams():
+    """
+    Returns (sender, receiver, stream name) for all pairs of nodes that transact
+    """
+    streams = []
+    for sender in range(params.numNodes):
+        for receiver in range(params.numNodes):
+            if params.txpm[sender][receiver] > 0 and sender != receiver:
+                streams.append((sender, receiver, params.streamName + str(sender) + "-" + str(receiver)))
+    return streams
 
 
 def createStreams():
@@ -89,24 +138,36 @@ def createStreams():
     Subscribes relevant nodes (as well as masternode, if so desired)
     """
     print ("Creating streams now ...")
+    start = time.time()
+    streams = pairedStreams()
 
-    for sender in range(params.numNodes):
-        for receiver in range(params.numNodes):
-            if params.txpm[sender][receiver] > 0 and sender != receiver:
+    # masternode creates all streams named after sender and receiver in one batch
+    txids = batch(0, [("create", ["stream", name, True]) for _, _, name in streams])
 
-                # masternode creates new stream named after sender and receiver
-                streamName = params.streamName + str(sender) + "-" + str(receiver)
-                create = {"method": "create", "params": ["stream", streamName, True]}
-                post(0, create); time.sleep(7)
+    # wait until all stream creations are confirmed
+    waitForConfirmations(0, txids, "stream creation")
 
-                # sender and receiver (and possibly masternode) subscribe to stream
-                subscribe = {"method": "subscribe", "params": [streamName]}
-                if params.masterSubAll:
-                    post(0, subscribe)
-                post(sender, subscribe); post(receiver, subscribe); time.sleep(2)
+    # sender and receiver (and possibly masternode) subscribe to their streams
+    subscriptions = {}
+    for sender, receiver, name in streams:
+        if params.masterSubAll:
+            subscriptions.setdefault(0, set()).add(name)
+        subscriptions.setdefault(sender, set()).add(name)
+        subscriptions.setdefault(receiver, set()).add(name)
 
-    print ("Finished creating streams. Sleeping for 30 s.")
-    time.sleep(30)
+    def subscribe(node):
+        names = sorted(subscriptions[node])
+        known = lambda: set(names) <= set(stream["name"] for stream in rpc(node, "liststreams"))
+        waitFor(known, "node " + str(node) + " to know its streams")
+        rpc(node, "subscribe", names)
+
+        subscribed = lambda: all(stream["subscribed"] for stream in rpc(node, "liststreams", names))
+        waitFor(subscribed, "node " + str(node) + " to subscribe to its streams")
+
+    with ThreadPoolExecutor(max_workers=params.sampleWorkers) as pool:
+        list(pool.map(subscribe, subscriptions))
+
+    print ("Finished creating " + str(len(streams)) + " streams in " + str(round(time.time() - start)) + " s.")
 
 
 def createDirectory():
@@ -114,11 +175,15 @@ def createDirectory():
     Creates a directory in data/ to store measurements, plots, etc. in
     """
     i = 0
-    while os.path.isdir(params.directory + "-" + str(i)):
-        i += 1
-    directory = params.directory + "-" + str(i)
-    subprocess.call("mkdir " + directory, shell=True)
+    while True:
+        directory = params.directory + "-" + str(i)
+        try:
+            os.mkdir(directory)
+            break
+        except FileExistsError:
+            i += 1
     print ("Created ", directory)
+    catalog.register(directory)
     return directory
 
 
@@ -127,6 +192,11 @@ def writeJmxFile(directory):
     Creates JMeter testplan based on the testplan-template, according to params.py
     """
 
+    # JMeter reads the data of a stream once and sends it with every transaction, see params.payloadPool
+    if params.loadGenerator == "jmeter" and params.txSizeSpread > 0:
+        print ("Warning: JMeter sends the same payload with every transaction of a stream, " +
+               "txSizeSpread and payloadPool only apply to loadGenerator = \"native\"")
+
     tree = ET.parse("templates/testplan.jmx")
     root = tree.getroot()
 
@@ -136,7 +206,7 @@ def writeJmxFile(directory):
     variables.find('./elementProp[@name="sigma"]')[1].text = str(params.sigma)
     variables.find('./elementProp[@name="numnodes"]')[1].text = str(params.numNodes)
     variables.find('./elementProp[@name="rampupperiod"]')[1].text = str(params.sigma / 1000)
-    variables.find('./elementProp[@name="data"]')[1].text = ''.join(random.choices(string.digits, k=ceil(params.txSize*1024)*2-20)) # subtract uuid size
+    variables.find('./elementProp[@name="data"]')[1].text = str(payloads.PayloadPool([params.txSize], params.payloadEntropy, reserved=20)[0], "ascii") # subtract uuid size
 
     if params.offchain:
         variables.find('./elementProp[@name="offchain"]')[1].text = "offchain"
@@ -161,7 +231,11 @@ def writeJmxFile(directory):
             defaults.find('./stringProp[@name="HTTPSampler.port"]').text = str(params.rpcPorts[sender])
             threadCSV.find('./stringProp[@name="filename"]').text = "node" + str(sender) + ".csv"
 
-            # create file with delay, streamname, and loop count for each receiver
+            # with sizes per pair, each receiver also gets its own data, replacing the shared one
+            if params.txSizes is not None:
+                threadCSV.find('./stringProp[@name="variableNames"]').text = "delay,streamname,loopcount,data"
+
+            # create file with delay, streamname, and loop count (and data) for each receiver
             with open(directory + "/node" + str(sender) + ".csv", "w") as outfile:
                 wr = csv.writer(outfile)
                 for receiver in range(params.numNodes):
@@ -169,7 +243,10 @@ def writeJmxFile(directory):
                         delay = str(round (60 * 1000 / params.txpm[sender][receiver])) # in ms
                         streamName = params.streamName + str(sender) + "-" + str(receiver)
                         loopCount = ceil(params.txpm[sender][receiver] * params.testDuration)
-                        wr.writerow([delay, streamName, loopCount])
+                        row = [delay, streamName, loopCount]
+                        if params.txSizes is not None:
+                            row.append(str(payloads.PayloadPool([params.txSizes[sender][receiver]], params.payloadEntropy, reserved=20)[0], "ascii"))
+                        wr.writerow(row)
 
             # prepend to threadGroupParent
             threadGroupParent.insert(2, threadGroup)
@@ -180,86 +257,173 @@ def writeJmxFile(directory):
     threadGroupParent.remove(hashTreeBase)
 
     # save a copy of params.py, txpm, and write out the new jmx file
-    subprocess.call("cp params.py " + directory + "/", shell=True)
+    saveParams(directory)
+    catalog.recordParams(directory, params)
     np.savetxt(directory + "/txpm.txt", params.txpm, delimiter=',')
     tree.write(open(directory + "/benchmark.jmx", "w"), encoding="unicode")
 
 
-def runTest(directory):
+def saveParams(directory):
     """
-    Starts the JMeter test
+    Saves a copy of params.py in the directory, with the values overridden for this run appended
     """
-    subprocess.Popen("jmeter -n -t " + directory + "/benchmark.jmx", shell=True)
+    with open("params.py") as infile, open(directory + "/params.py", "w") as outfile:
+        outfile.write(infile.read())
+        if params.overrides:
+            outfile.write("\n\n# overridden for this run\n")
+            for key, value in params.overrides.items():
+                outfile.write(key + " = " + repr(value) + "\n")
 
 
-def getMeasurements(directory):
+def runTest(directory):
     """
-    Writes measured values to csv file. Each row has format
-    [elapsed time (s), chain growth (KB), size of items (KB), disk space node0 (KB), disk space node1 (KB), ..., ]
+    Starts the load generator (JMeter or loadgen.py, see params.loadGenerator) in its own process group,
+    returns its process
+    Every publish request is written to results.jtl (csv) together with its stream and key
     """
+    if params.loadGenerator == "native":
+        return subprocess.Popen([sys.executable, "loadgen.py", directory], start_new_session=True)
 
-    recentBlock, chainSize, numMeasurements = 0, 0, 0
-    tail = min(180, max(0.05 * params.testDuration, 60))
-    start = time.time()
-
-    while time.time() < start + 60 * params.testDuration + tail:
+    return subprocess.Popen("jmeter -n -t " + directory + "/benchmark.jmx -j " + directory + "/jmeter.log" +
+                            " -l " + directory + "/" + latency.RESULTS +
+                            " -Jjmeter.save.saveservice.output_format=csv" +
+                            " -Jjmeter.save.saveservice.print_field_names=true" +
+                            " -Jjmeter.save.saveservice.timestamp_format=ms" +
+                            " -Jsample_variables=streamname,uuid",
+                            shell=True, start_new_session=True)
 
-        # get time elapsed so far
-        elapsed = time.time() - start
 
-        # if there's been a new block, update relative size of blockchain
-        height = post(0, {"method": "listblocks", "params": [[-1]]}).json()["result"][0]["height"]
-        if recentBlock != height:
-            chainSize += post(0, {"method": "getblock", "params": [str(height)]}).json()["result"]["size"] / 1024.
-            recentBlock = height
-
-        # count the total number of streamitems published
-        itemCount = 0
-        if params.masterSubAll:
-            lst = post(0, {"method": "liststreams"}).json()["result"]
-            for stream in lst:
-                itemCount += stream["items"]
-        else:
-            for sender in range(params.numNodes):
-                lst = post(sender, {"method": "liststreams"}).json()["result"]
-                for receiver in range(params.numNodes):
-                    if params.txpm[sender][receiver] > 0 and sender != receiver:
-                        streamName = params.streamName + str(sender) + "-" + str(receiver)
-                        stream = next((item for item in lst if item["name"] == streamName))
-                        itemCount += stream["items"]
+def stopTest(process):
+    """
+    Stops the load generator before it is done
+    """
+    if process is not None and process.poll() is None:
+        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
 
-        row = [elapsed, chainSize, itemCount * params.txSize]
 
-        # get total disk space of the chain on each node, and append
-        for i in range(params.numNodes):
-            cmd = "docker exec -ti " + params.containerName + str(i) + " du -s /root/.multichain/" + params.chain["all"]["CHAINNAME"]
-            space = subprocess.check_output(cmd, shell=True).decode("utf-8").split("\t", 1)[0]
-            row.append(float(space))
+def printStatus(fit, elapsed):
+    """
+    Prints the current slope of each node with its confidence interval and the projected usage after a year
+    """
+    year = 60 * 60 * 24 * 365.23
+    print ("After " + str(round(elapsed / 60, 1)) + " min:")
+    for i in range(params.numNodes):
+        projected = (fit.intercept[i] + fit.slope[i] * year) / (1024 * 1024)
+        print ("  node" + str(i) + ": " + str(round(fit.slope[i] * 60, 2)) + " +/- " + str(round(fit.ci[i] * 60, 2)) +
+               " KB/min, " + str(round(projected, 2)) + " GB after 365 days")
 
-        # note down measurements
-        with open(directory + "/measurements.csv", "a") as outfile:
-            wr = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-            wr.writerow([round(el, 2) for el in row])
 
-        # note down exact disk space usage
-        if params.diskSpaceDetailed:
-            for i in range(params.numNodes):
-                with open(directory + "/diskspace" + str(i) + ".csv", "a") as outfile:
-                    wr = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-                    cmd = "docker exec -ti " + params.containerName + str(i) + " du /root/.multichain/" + params.chain["all"]["CHAINNAME"]
-                    space = subprocess.check_output(cmd, shell=True).decode("utf-8")
-                    wr.writerow([elapsed, space])
+def getMeasurements(directory, jmeter=None):
+    """
+    Writes measured values to the measurements table (measurements.csv by default). Each row has format
+    [elapsed time (s), chain growth (KB), size of items (KB), disk space node0 (KB), disk space node1 (KB), ..., ]
+    The time (s) at which each value was actually probed is written to the timestamps table in the same layout
+    Detailed disk space by subdirectory is written to the store of each node, see diskstore.py
+    Every block mined during the test is written to the blocks table as
+    [height, block time (s since epoch), tx count, size (KB), elapsed time when seen (s)]
+    A block replaced by a reorg is written again when seen, the last row of each height is current
+    With telemetry, the resource usage of each container is written to the telemetry table as
+    [elapsed time (s), CPU node0 (s), RSS node0 (KB), read node0 (KB), written node0 (KB),
+    received node0 (KB), sent node0 (KB), CPU node1 (s), ...], see telemetry.py
+
+    In latency mode, the time at which each item became visible on its receiver is written to the received
+    table as [sender, receiver, key, seen (s since epoch)], see latency.py
+
+    Slopes of disk space of all nodes are fitted while measuring, from the end of warm-up as detected by
+    steadystate.py. With earlyStop, the test (i.e. the given load generator process) is stopped as soon
+    as all slopes are known within earlyStopTolerance
+    """
 
-        # sleep until next measurement
-        numMeasurements += 1
-        while time.time() < start + numMeasurements * params.measureDelay:
-            time.sleep(0.5)
+    numMeasurements = 0
+    tail = min(180, max(0.05 * params.testDuration, 60))
+    start = time.time()
+    sampler = Sampler(start)
+
+    # keep all output open for the whole test, it is flushed even if the test is interrupted
+    installSignalHandlers()
+    columns = ["time", "chain size", "items"] + [params.containerName + str(i) for i in range(params.numNodes)]
+    measurements = openTable(directory, "measurements", columns)
+    timestamps = openTable(directory, "timestamps", columns)
+    blocks = openTable(directory, "blocks", ["height", "block time", "tx count", "size", "seen"])
+    stores = [DiskStore(directory, i) for i in range(params.numNodes)] if params.diskSpaceDetailed else []
+    usages = None
+    if params.telemetry:
+        usages = openTable(directory, "telemetry", ["time"] + telemetry.columns(columns[3:]))
+    watcher = None
+    if params.latencyMode:
+        watcher = latency.ItemWatcher(pairedStreams(), openTable(directory, "received", ["sender", "receiver", "key", "seen"]))
+
+    # fit the growth of disk space after warm-up, whose end is detected again every statusInterval
+    online, fitStart = None, None
+    measured = []
+    lastStatus, lastDetection = 0, 0
+
+    try:
+        while time.time() < start + 60 * params.testDuration + tail:
+
+            # probe all nodes concurrently
+            row, times, detailed, newBlocks, usage, duration = sampler.tick()
+
+            # note down measurements and when they were taken
+            measurements.write([round(el, 2) for el in row])
+            timestamps.write([round(el, 2) for el in times])
+            for block in newBlocks:
+                blocks.write(list(block) + [round(row[0], 2)])
+
+            # note down exact disk space usage
+            for i, (probed, sizes) in enumerate(detailed):
+                stores[i].append(probed, sizes)
+
+            # note down resource usage of the containers
+            if usages is not None:
+                usages.write([round(row[0], 2)] + [round(value, 3) for values in usage for value in values])
+
+            measured.append([row[0]] + row[3:])
+            if online is not None:
+                online.update(row[0], row[3:])
+
+            if len(measured) >= steadystate.MINROWS and (online is None or row[0] >= lastDetection + params.statusInterval):
+                lastDetection = row[0]
+                history = np.array(measured)
+                steadyRow = steadystate.steadyStart(history[:, 0], history[:, 1:])
+                if steadyRow != fitStart:
+                    fitStart, online = steadyRow, OnlineFit(params.numNodes)
+                    for values in history[steadyRow:]:
+                        online.update(values[0], values[1:])
+
+            if online is not None:
+                fit = online.fit()
+
+                if fit is not None and row[0] >= lastStatus + params.statusInterval:
+                    printStatus(fit, row[0])
+                    lastStatus = row[0]
+
+                if params.earlyStop and row[0] >= 60 * params.minTestDuration and \
+                        converged(fit, params.earlyStopTolerance, params.earlyStopFloor):
+                    print ("Slopes converged, stopping test early")
+                    printStatus(fit, row[0])
+                    stopTest(jmeter)
+                    break
+
+            # sleep until next measurement
+            numMeasurements = sampler.wait(numMeasurements + 1)
+
+    finally:
+        if watcher is not None:
+            watcher.close()
+        closeAll()
+        sampler.close()
+
+    print ("Finished measuring, " + str(sampler.overruns) + " tick(s) overran measureDelay")
+    txps, kbps = sampler.tracker.throughput()
+    print ("Throughput: " + str(round(txps, 2)) + " tx/s, " + str(round(kbps, 2)) + " KB/s")
 
 
 def plotResults(directory):
     """
     Plots measurements with transaction volume and disk space usage on y-axis against time
     """
+    import plotDiskUsage
 
     # plots total disk usage for each node
     plotDiskUsage.plotResults(directory)
@@ -271,11 +435,11 @@ def plotResults(directory):
 
 def cleanUp():
     """
-    Brings down the network and removes temporary created files
+    Brings down the network (unless it is kept warm for the next run) and removes temporary created files
     """
-    subprocess.call("docker-compose down", shell=True)
-    subprocess.call("rm docker-compose.yml", shell=True)
-    subprocess.call("rm jmeter.log", shell=True)
+    if not params.keepWarm:
+        compose("down")
+    subprocess.call("rm " + params.composeFile, shell=True)
 
 
 def main():
@@ -284,10 +448,13 @@ def main():
     createStreams()
     directory = createDirectory()
     writeJmxFile(directory)
-    runTest(directory)
-    getMeasurements(directory)
+    jmeter = runTest(directory)
+    getMeasurements(directory, jmeter)
+    latency.report(directory)
+    catalog.recordSummary(directory)
     plotResults(directory)
     cleanUp()
+    return directory
 
 if __name__ == "__main__":
     main()
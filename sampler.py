@@ -0,0 +1,219 @@
+"""
+Concurrent sampler used by runTest.getMeasurements
+
+All rpc and disk probes of a single measurement tick are fanned out over a thread pool,
+so a tick takes about as long as its slowest probe instead of the sum of all probes.
+Every probe is stamped with its own time, and ticks that take longer than measureDelay
+are reported as overruns instead of silently shifting the sampling schedule
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import time
+
+from blocks import BlockTracker
+from diskagent import DiskAgent
+from diskstore import parseDu
+from helpers import *
+from telemetry import Telemetry
+import params
+
+
+def chainDir():
+    """
+    Path of the chain directory inside of the containers
+    """
+    return "/root/.multichain/" + params.chain["all"]["CHAINNAME"]
+
+
+def itemSize(node, lst):
+    """
+    Size (KB) of the items in the streams relevant to the given node, by the transaction size of each stream:
+    all streams for the masternode if it is subscribed to all, otherwise the streams it sends to
+    """
+    sizes = getTxSizes(params)
+    items = dict((stream["name"], stream["items"]) for stream in lst)
+    senders = range(params.numNodes) if node == 0 and params.masterSubAll else [node]
+
+    size = 0
+    for sender in senders:
+        for receiver in range(params.numNodes):
+            if params.txpm[sender][receiver] > 0 and sender != receiver:
+                size += items[params.streamName + str(sender) + "-" + str(receiver)] * sizes[sender][receiver]
+    return size
+
+
+def probeItems(node):
+    """
+    Returns the size (KB) of the items in the streams relevant to the given node
+    """
+    return itemSize(node, rpc(node, "liststreams"))
+
+
+def probeDisk(node):
+    """
+    Returns total disk space (KB) of the chain directory on the given node
+    """
+    cmd = "docker exec -ti " + params.containerName + str(node) + " du -s " + chainDir()
+    return float(subprocess.check_output(cmd, shell=True).decode("utf-8").split("\t", 1)[0])
+
+
+def probeDiskDetailed(node):
+    """
+    Returns disk space (KB) of all subdirectories of the chain directory on the given node by path
+    """
+    cmd = "docker exec -ti " + params.containerName + str(node) + " du " + chainDir()
+    return parseDu(subprocess.check_output(cmd, shell=True).decode("utf-8"))
+
+
+def timed(start, probe, *args):
+    """
+    Runs a probe and returns its result together with the time (s since start) halfway through it
+    """
+    before = time.time()
+    result = probe(*args)
+    after = time.time()
+    return (before + after) / 2 - start, result
+
+
+def itemNodes():
+    """
+    Nodes that have to be asked for their streams to measure all published items
+    """
+    if params.masterSubAll:
+        return [0]
+    return [i for i in range(params.numNodes) if sum(params.txpm[i]) > 0]
+
+
+class Sampler:
+    """
+    Takes one measurement of all nodes per call to tick(), running all probes concurrently
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.pool = ThreadPoolExecutor(max_workers=params.sampleWorkers)
+        self.tracker = BlockTracker(0)
+        self.overruns = 0
+        self.agents = {}
+
+        # start disk usage agents, nodes whose agent fails to report are probed with du instead
+        if params.diskAgent:
+            agents = [DiskAgent(i, chainDir()) for i in range(params.numNodes)]
+            for agent in agents:
+                if agent.ready(10):
+                    self.agents[agent.node] = agent
+                else:
+                    print ("Warning: no disk usage agent on node " + str(agent.node) +
+                           " (is python3 installed in its image?), measuring with du on every tick instead")
+                    agent.close()
+
+        # resource usage of the containers, see telemetry.py
+        self.telemetry = None
+        if params.telemetry:
+            self.telemetry = Telemetry([params.containerName + str(i) for i in range(params.numNodes)])
+
+    def agent(self, node):
+        """
+        Returns the disk usage agent of the given node, None if it has none or its agent stopped
+        """
+        agent = self.agents.get(node)
+        if agent is not None and not agent.alive():
+            if self.agents.pop(node, None) is not None:
+                print ("Warning: disk usage agent on node " + str(node) + " stopped, measuring with du on every tick instead")
+            return None
+        return agent
+
+    def probeDisk(self, node):
+        """
+        Returns time and total disk space of the chain on the given node, from its agent if possible
+        """
+        agent = self.agent(node)
+        if agent is not None:
+            received, space = agent.total()
+            return received - self.start, space
+        return timed(self.start, probeDisk, node)
+
+    def probeDiskDetailed(self, node):
+        """
+        Returns time and detailed disk usage of the given node, from its agent if possible
+        """
+        agent = self.agent(node)
+        if agent is not None:
+            received, sizes = agent.detailed()
+            return received - self.start, sizes
+        return timed(self.start, probeDiskDetailed, node)
+
+    def probeMaster(self):
+        """
+        Asks the masternode for the most recent block and its streams in a single batch request
+        Fetches all blocks mined since the last tick, returns them and the size of the items measured on the masternode
+        """
+        calls = [("listblocks", [[-1]])]
+        if 0 in itemNodes():
+            calls.append(("liststreams", []))
+        results = batch(0, calls)
+
+        newBlocks = self.tracker.update(results[0][0]["height"])
+        items = itemSize(0, results[1]) if len(results) > 1 else 0
+        return newBlocks, items
+
+    def tick(self):
+        """
+        Returns the measurement row, matching timestamps of each value and the duration of the tick
+        [elapsed time (s), chain growth (KB), size of items (KB), disk space node0 (KB), ...]
+        as well as disk usage by subdirectory per node if diskSpaceDetailed is set,
+        the blocks mined since the last tick as (height, block time, tx count, size in KB)
+        and the resource usage of each node's container if telemetry is set (see telemetry.METRICS)
+        """
+        tickStart = time.time()
+        elapsed = tickStart - self.start
+
+        master = self.pool.submit(timed, self.start, self.probeMaster)
+        items = [self.pool.submit(timed, self.start, probeItems, i) for i in itemNodes() if i != 0]
+        disks = [self.pool.submit(self.probeDisk, i) for i in range(params.numNodes)]
+        if params.diskSpaceDetailed:
+            detailed = [self.pool.submit(self.probeDiskDetailed, i) for i in range(params.numNodes)]
+        else:
+            detailed = []
+        if self.telemetry is not None:
+            usage = [self.pool.submit(self.telemetry.probe, i) for i in range(params.numNodes)]
+        else:
+            usage = []
+
+        masterTime, (newBlocks, itemsSize) = master.result()
+
+        items = [future.result() for future in items]
+        itemTime = max([masterTime] + [t for t, _ in items])
+        itemsSize += sum(size for _, size in items)
+
+        disks = [future.result() for future in disks]
+        detailed = [future.result() for future in detailed]
+        usage = [future.result() for future in usage]
+
+        row = [elapsed, self.tracker.chainSize(), itemsSize] + [space for _, space in disks]
+        times = [elapsed, masterTime, itemTime] + [t for t, _ in disks]
+
+        return row, times, detailed, newBlocks, usage, time.time() - tickStart
+
+    def wait(self, numMeasurements):
+        """
+        Sleeps until the slot of the given measurement, skipping and reporting slots that were overrun
+        Returns the number of the measurement that is taken next
+        """
+        due = self.start + numMeasurements * params.measureDelay
+        if time.time() > due:
+            missed = int((time.time() - due) // params.measureDelay) + 1
+            self.overruns += 1
+            print ("Warning: measurement tick overran measureDelay, skipping " + str(missed) + " slot(s)")
+            numMeasurements += missed
+            due += missed * params.measureDelay
+
+        while time.time() < due:
+            time.sleep(min(0.5, max(0, due - time.time())))
+        return numMeasurements
+
+    def close(self):
+        self.pool.shutdown()
+        for agent in self.agents.values():
+            agent.close()
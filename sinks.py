@@ -0,0 +1,242 @@
+"""
+Buffered sinks for the measurements taken during a test
+
+Sinks keep their file open for the whole test, buffer writes and flush + fsync them every
+flushInterval seconds. All open sinks are closed (and thereby flushed) when the process exits,
+including on SIGINT / SIGTERM, so an interrupted test keeps all measurements taken so far
+
+Tables of measurements can be stored with the following backends, selected by params.sinkBackend:
+- "csv": name.csv, one quoted row per measurement without header (the original format)
+- "binary": name.dat with float64 records and the columns in name.json
+- "sqlite": table name in measurements.db
+"""
+
+import atexit
+import csv
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import params
+
+
+BUFFER = 1 << 16
+DTYPE = np.dtype("<f8")
+
+openSinks = []
+openLock = threading.Lock()
+
+
+class Sink:
+    """
+    Base class of all sinks: an open file that is flushed and synced to disk periodically
+    """
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.file = open(path, mode, buffering=BUFFER)
+        self.lastSync = time.time()
+        with openLock:
+            openSinks.append(self)
+
+    def written(self):
+        """
+        To be called after each write, syncs the file if flushInterval has passed
+        """
+        if time.time() > self.lastSync + params.flushInterval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.lastSync = time.time()
+
+    def close(self):
+        with openLock:
+            if self not in openSinks:
+                return
+            openSinks.remove(self)
+        self.sync()
+        self.file.close()
+
+
+class CsvSink(Sink):
+
+    def __init__(self, path, columns):
+        super().__init__(path, "a")
+        self.writer = csv.writer(self.file, quoting=csv.QUOTE_ALL)
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.written()
+
+
+def headerPath(path):
+    """
+    Returns the header (.json) of the binary table stored at path (.dat)
+    """
+    return path[:-len(".dat")] + ".json"
+
+
+def writeHeader(path, columns):
+    """
+    Writes the header of the binary table stored at path (.dat): its columns and the dtype of its records
+    """
+    with open(headerPath(path), "w") as outfile:
+        json.dump({"columns": columns, "dtype": DTYPE.str}, outfile)
+
+
+def readRecords(path):
+    """
+    Returns the columns and a read-only, memory-mapped (rows x columns) array of the binary table
+    stored at path (.dat), without a last record that is only partially written
+    This is the only reader of the binary format, shared by readTable, runData and diskstore
+    """
+    with open(headerPath(path)) as infile:
+        meta = json.load(infile)
+    columns, dtype = meta["columns"], np.dtype(meta["dtype"])
+    if os.path.getsize(path) < dtype.itemsize * len(columns):
+        return columns, np.zeros((0, len(columns)), dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode="r")
+    return columns, records[:records.shape[0] // len(columns) * len(columns)].reshape(-1, len(columns))
+
+
+class BinarySink(Sink):
+
+    def __init__(self, path, columns):
+        writeHeader(path, columns)
+        super().__init__(path, "ab")
+
+    def write(self, row):
+        self.file.write(np.asarray(row, dtype=DTYPE).tobytes())
+        self.written()
+
+
+class SqliteDatabase:
+    """
+    Connection to a database shared by all sqlite sinks writing to it, since sqlite only allows
+    a single open write transaction per file. Rows of all tables are buffered in one transaction
+    that is committed every flushInterval seconds
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.lastSync = time.time()
+        self.sinks = 0
+
+    def execute(self, statement, values=()):
+        with self.lock:
+            self.connection.execute(statement, values)
+            if time.time() > self.lastSync + params.flushInterval:
+                self.sync()
+
+    def sync(self):
+        self.connection.commit()
+        self.lastSync = time.time()
+
+
+databases = {}      # path -> SqliteDatabase of the open sqlite sinks
+
+
+class SqliteSink:
+    """
+    Table in a database, written through the connection shared with the other tables of the database
+    """
+
+    def __init__(self, path, table, columns):
+        self.path, self.table = path, table
+        with openLock:
+            if path not in databases:
+                databases[path] = SqliteDatabase(path)
+            self.database = databases[path]
+            self.database.sinks += 1
+            openSinks.append(self)
+
+        names = ", ".join('"' + column + '" REAL' for column in columns)
+        self.database.execute('CREATE TABLE IF NOT EXISTS "' + table + '" (' + names + ')')
+        self.insert = 'INSERT INTO "' + table + '" VALUES (' + ", ".join("?" * len(columns)) + ')'
+
+    def write(self, row):
+        self.database.execute(self.insert, [float(el) for el in row])
+
+    def sync(self):
+        with self.database.lock:
+            self.database.sync()
+
+    def close(self):
+        with openLock:
+            if self not in openSinks:
+                return
+            openSinks.remove(self)
+            self.database.sinks -= 1
+            last = self.database.sinks == 0
+            if last:
+                del databases[self.path]
+        self.sync()
+        if last:
+            self.database.connection.close()
+
+
+def openTable(directory, name, columns, backend=None):
+    """
+    Opens a sink for a table of measurements with the given columns in the test directory
+    """
+    backend = backend or params.sinkBackend
+    if backend == "csv":
+        return CsvSink(directory + "/" + name + ".csv", columns)
+    elif backend == "binary":
+        return BinarySink(directory + "/" + name + ".dat", columns)
+    elif backend == "sqlite":
+        return SqliteSink(directory + "/measurements.db", name, columns)
+    raise ValueError("unknown sink backend " + str(backend))
+
+
+def readTable(directory, name):
+    """
+    Reads a table written by any of the backends, returns a (rows x columns) array
+    """
+    if os.path.isfile(directory + "/" + name + ".csv"):
+        import pandas as pd
+        return pd.read_csv(directory + "/" + name + ".csv", header=None).values
+    elif os.path.isfile(directory + "/" + name + ".dat"):
+        return readRecords(directory + "/" + name + ".dat")[1]
+    elif os.path.isfile(directory + "/measurements.db"):
+        connection = sqlite3.connect(directory + "/measurements.db")
+        try:
+            if not connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone():
+                raise FileNotFoundError("no table " + name + " in " + directory)
+            rows = connection.execute('SELECT * FROM "' + name + '" ORDER BY rowid').fetchall()
+        finally:
+            connection.close()
+        return np.array(rows, dtype=DTYPE)
+    raise FileNotFoundError("no table " + name + " in " + directory)
+
+
+def closeAll():
+    """
+    Flushes and closes all sinks that are still open
+    """
+    for sink in list(openSinks):
+        sink.close()
+
+
+def terminate(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def installSignalHandlers():
+    """
+    Turns SIGTERM into a regular exit (SIGINT already raises KeyboardInterrupt),
+    so that open sinks are flushed by closeAll
+    """
+    signal.signal(signal.SIGTERM, terminate)
+
+
+atexit.register(closeAll)
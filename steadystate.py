@@ -0,0 +1,118 @@
+"""
+Detection of the end of warm-up in measurements, from which on disk space grows linearly
+
+The steady state of a column starts at the earliest row from which on the slope fitted to the rest of
+the column agrees with the slope of its second half, within TOLERANCE (relative) or twice the standard
+error of their difference, and keeps agreeing for all later starts. Transients at the start of a test that
+would bias the slope by more than that are cut off, while no samples are wasted on warm-up where they
+wouldn't. The slopes of all possible starts of all columns are computed at once from cumulative sums,
+in O(rows x columns)
+
+The fitting window of each column of a test run is recorded in steadystate.json in its directory,
+and in the summary of the run in the catalog
+"""
+
+import json
+
+import numpy as np
+
+from fitting import fitColumns
+import runData
+
+
+FILENAME = "steadystate.json"
+MINROWS = 24                # minimum number of samples to look for the end of warm-up at all
+MAXWARMUP = 0.5             # maximum fraction of the samples that may belong to the warm-up
+TOLERANCE = 0.02            # maximum deviation of the slope from the slope of the second half, relative
+FLOOR = 0.01                # KB/s, smaller deviations always count as steady (e.g. for idle nodes)
+
+
+def prefixSums(x):
+    return np.concatenate((np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)))
+
+
+def changePoints(time, data, maxWarmup=MAXWARMUP, tolerance=TOLERANCE, floor=FLOOR):
+    """
+    Returns the first row of the steady state of each column of data (samples x columns) against time (s)
+    """
+    data = np.asarray(data, dtype=float)
+    n, m = data.shape
+    if n < MINROWS:
+        return np.zeros(m, dtype=int)
+
+    # subtracting the fit of the whole column (against standardized time) doesn't change the fits of
+    # any of its segments, but keeps the cumulative sums small enough to stay accurate
+    t = np.asarray(time, dtype=float).reshape(-1)
+    unit = t.std() or 1
+    t = (t - t.mean()) / unit
+    fit = fitColumns(t, data)
+    residuals = data - (fit.intercept + fit.slope * t.reshape(-1, 1))
+    scale = residuals.std(axis=0)
+    scale = np.where(scale > 0, scale, 1)
+    residuals /= scale
+
+    T, TT = prefixSums(t), prefixSums(t * t)
+    Y, TY, YY = prefixSums(residuals), prefixSums(t.reshape(-1, 1) * residuals), prefixSums(residuals ** 2)
+
+    def segments(a, b):
+        """
+        Slopes (KB/s) and their standard errors of the fits to rows [a, b) of all columns, for arrays of rows a and b
+        """
+        count = (b - a).reshape(-1, 1)
+        st, stt = (T[b] - T[a]).reshape(-1, 1), (TT[b] - TT[a]).reshape(-1, 1)
+        sy, sty, syy = Y[b] - Y[a], TY[b] - TY[a], YY[b] - YY[a]
+        sxx = stt - st * st / count
+        sxy = sty - st * sy / count
+        slope = sxy / sxx
+        sse = np.maximum(syy - sy * sy / count - sxy * slope, 0)
+        stderr = np.sqrt(sse / np.maximum(count - 2, 1) / sxx)
+        return (fit.slope + slope * scale) / unit, stderr * scale / unit
+
+    half = int(maxWarmup * n)
+    starts = np.arange(half + 1)
+    slopes, errors = segments(starts, np.full_like(starts, n))
+    steady, stderr = segments(np.array([half]), np.array([n]))
+
+    margin = np.maximum(tolerance * np.abs(steady), 2 * np.sqrt(errors ** 2 + stderr ** 2))
+    agrees = np.abs(slopes - steady) <= np.maximum(margin, floor)
+
+    # first start from which on all later starts agree as well
+    stable = np.cumprod(agrees[::-1], axis=0)[::-1].astype(bool)
+    return np.argmax(stable, axis=0)
+
+
+def steadyStart(time, data):
+    """
+    Returns the first row from which on all columns are in steady state
+    """
+    return int(np.max(changePoints(time, data), initial=0))
+
+
+def window(directory):
+    """
+    Returns the fitting window of each column of the measurements of a test run (after time) as
+    {"startrow": [...], "startTime": [...]}, detected once and stored in steadystate.json
+    """
+    path, _ = runData.source(directory, "measurements")
+    key = runData.sourceKey(path)
+    try:
+        with open(directory + "/" + FILENAME) as infile:
+            result = json.load(infile)
+        if result["source"] == key:
+            return result
+    except (OSError, ValueError, KeyError):
+        pass
+
+    data = runData.measurements(directory)
+    rows = changePoints(data[:, 0], data[:, 1:])
+    result = {"source": key, "startrow": rows.tolist(), "startTime": data[rows, 0].tolist()}
+    with open(directory + "/" + FILENAME, "w") as outfile:
+        json.dump(result, outfile)
+    return result
+
+
+def startrows(directory):
+    """
+    Returns the first row of the steady state of each column of the measurements of a test run (after time)
+    """
+    return np.array(window(directory)["startrow"], dtype=int)
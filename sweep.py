@@ -0,0 +1,196 @@
+"""
+Runs runTest for every configuration of a parameter sweep
+
+Usage: python sweep.py sweep.json [--workers n]
+
+The sweep file is a json object, either with a grid of values to combine and/or a list of runs,
+both on top of shared base values, e.g.
+{
+    "name": "txsize",
+    "base": {"testDuration": 120},
+    "grid": {"txSize": [16, 64, 128], "offchain": [true, false]},
+    "runs": [{"txSize": 1.53, "txpm": [[0, 4], [4, 0]], "numNodes": 2, "labels": ["a", "b"]}]
+}
+Keys are names of values in params.py. Each configuration runs on its own network; with more than one
+worker, several networks run in parallel on separate port ranges, container names and compose projects.
+
+Every finished or failed run is recorded in data/sweeps/<name>.jsonl together with its parameters and
+test directory. Running the same sweep again skips configurations that already finished, so a sweep
+can be resumed after a failure or interruption
+"""
+
+from base64 import b64encode
+import argparse
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import traceback
+
+import helpers
+import params
+
+
+SWEEPDIR = "data/sweeps"
+PORTSTRIDE = 100            # distance between the port ranges of networks running in parallel
+
+# values of params.py before any configuration was applied
+baseline = dict((key, copy.deepcopy(value)) for key, value in vars(params).items()
+                if not key.startswith("__") and not callable(value) and type(value).__name__ != "module")
+
+slot = 0                    # worker slot of this process
+
+
+def configurations(sweep):
+    """
+    Returns the list of configurations described by a sweep
+    """
+    base = sweep.get("base", {})
+    configs = []
+
+    grid = sweep.get("grid", {})
+    if grid:
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            configs.append({**base, **dict(zip(keys, values))})
+
+    for run in sweep.get("runs", []):
+        configs.append({**base, **run})
+
+    return configs
+
+
+def configKey(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def network(slot):
+    """
+    Values that separate the network of the given worker slot from those of other workers
+    Slot 0 uses the same ports, names and directories as params.py
+    """
+    if params.offchain:
+        directory, networkPort, rpcPort, containerName = "data/testfiles-offchain", 7557, 8002, "node-off"
+    else:
+        directory, networkPort, rpcPort, containerName = "data/testfiles-onchain", 7567, 8012, "node-on"
+
+    offset = slot * PORTSTRIDE
+    values = {
+        "directory": directory,
+        "networkPorts": [networkPort + offset + i for i in range(params.numNodes)],
+        "rpcPorts": [rpcPort + offset + i for i in range(params.numNodes)],
+        "containerName": containerName,
+        "composeFile": "docker-compose.yml",
+        "composeProject": "multichain-benchmark",
+    }
+    if slot > 0:
+        values["containerName"] += "-" + str(slot) + "-"
+        values["composeFile"] = "docker-compose-" + str(slot) + ".yml"
+        values["composeProject"] += "-" + str(slot)
+    return values
+
+
+def applyConfig(config, slot=0):
+    """
+    Resets params to the values in params.py and applies the given configuration on top,
+    including the network values derived from it
+    """
+    for key, value in baseline.items():
+        setattr(params, key, copy.deepcopy(value))
+
+    unknown = [key for key in config if key not in baseline]
+    if unknown:
+        raise KeyError("unknown parameters " + ", ".join(unknown))
+
+    overrides = dict(config)
+    for key, value in config.items():
+        setattr(params, key, copy.deepcopy(value))
+
+    for key, value in network(slot).items():
+        if key not in config and value != baseline[key]:
+            setattr(params, key, value)
+            overrides[key] = value
+
+    if "chain" in config:
+        params.header = {"Authorization": "Basic " + b64encode(bytes(params.chain["all"]["RPC_USER"] +
+                         ":" + params.chain["all"]["RPC_PASSWORD"], "utf-8")).decode("ascii")}
+
+    params.overrides = overrides
+
+    # sessions carry the ports and credentials of the previous configuration
+    helpers.sessions.clear()
+
+
+def initWorker(slots):
+    global slot
+    slot = slots.get()
+
+
+def runConfig(config):
+    """
+    Runs a single configuration in a worker, returns its record for the sweep index
+    """
+    import runTest
+
+    record = {"config": config, "slot": slot}
+    try:
+        applyConfig(config, slot)
+        record["directory"] = runTest.main()
+        record["status"] = "done"
+    except Exception:
+        record["status"] = "failed"
+        record["error"] = traceback.format_exc()
+        try:
+            runTest.cleanUp()
+        except Exception:
+            pass
+    return record
+
+
+def readIndex(path):
+    records = []
+    if os.path.isfile(path):
+        with open(path) as infile:
+            records = [json.loads(line) for line in infile if line.strip()]
+    return records
+
+
+def runSweep(sweep, workers=1):
+    """
+    Runs all configurations of the sweep that haven't finished yet, returns the records of this sweep
+    """
+    os.makedirs(SWEEPDIR, exist_ok=True)
+    path = SWEEPDIR + "/" + sweep.get("name", "sweep") + ".jsonl"
+
+    done = set(configKey(record["config"]) for record in readIndex(path) if record["status"] == "done")
+    todo = [config for config in configurations(sweep) if configKey(config) not in done]
+    print ("Sweep " + path + ": " + str(len(done)) + " done, " + str(len(todo)) + " to run")
+
+    slots = multiprocessing.Manager().Queue()
+    for i in range(workers):
+        slots.put(i)
+
+    # each worker gets its own slot, i.e. its own network, and runs one configuration at a time
+    with multiprocessing.Pool(workers, initializer=initWorker, initargs=(slots,)) as pool:
+        for record in pool.imap_unordered(runConfig, todo):
+            with open(path, "a") as outfile:
+                outfile.write(json.dumps(record) + "\n")
+            print ("Run " + record["status"] + ": " + configKey(record["config"]))
+
+    return readIndex(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs a parameter sweep of benchmark tests")
+    parser.add_argument("sweep", help="json file describing the sweep")
+    parser.add_argument("--workers", type=int, default=1, help="number of networks running in parallel")
+    args = parser.parse_args(argv)
+
+    with open(args.sweep) as infile:
+        sweep = json.load(infile)
+    runSweep(sweep, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Resource usage of the node containers, measured alongside disk usage by sampler.py
+
+For each container, the cumulative counters of its cgroup are read straight from the host:
+- CPU time used (s)
+- resident memory (KB, anonymous memory of the cgroup, i.e. mostly multichaind)
+- bytes read from and written to block devices (KB)
+- bytes received and sent over the network (KB, all interfaces in the network namespace of the container)
+
+Reading them costs a few small file reads per container. The containers are looked up once with
+docker inspect, and both cgroup v1 and v2 layouts are supported. If the cgroup files aren't readable
+(e.g. Docker running in a VM), the same counters are taken from a single stats request per container
+to the Docker Engine API on its unix socket instead. Values that can't be measured are NaN
+
+Rates (CPU load, write rates, write amplification, ...) are derived from the counters when plotting
+"""
+
+from http.client import HTTPConnection
+import json
+import math
+import socket
+import subprocess
+
+import params
+
+
+CGROUP = "/sys/fs/cgroup"
+SOCKET = "/var/run/docker.sock"
+METRICS = ["cpu", "rss", "read", "written", "received", "sent"]
+
+
+def columns(containers):
+    """
+    Column names of the telemetry table (after time) for the given containers
+    """
+    return [container + " " + metric for container in containers for metric in METRICS]
+
+
+def readKeys(path):
+    """
+    Returns the values of a flat keyed cgroup file like memory.stat or cpu.stat
+    """
+    values = {}
+    with open(path) as infile:
+        for line in infile:
+            key, _, value = line.partition(" ")
+            values[key] = int(value)
+    return values
+
+
+def readNetwork(pid):
+    """
+    Returns bytes received and sent over all interfaces but loopback in the network namespace of a process
+    """
+    received, sent = 0, 0
+    with open("/proc/" + str(pid) + "/net/dev") as infile:
+        for line in list(infile)[2:]:
+            interface, _, counters = line.partition(":")
+            if interface.strip() != "lo":
+                counters = counters.split()
+                received += int(counters[0])
+                sent += int(counters[8])
+    return received, sent
+
+
+def cgroupPaths(pid):
+    """
+    Returns the cgroup directories of a process on the host by controller, "" for the unified hierarchy (v2)
+    """
+    paths = {}
+    with open("/proc/" + str(pid) + "/cgroup") as infile:
+        for line in infile:
+            _, controllers, path = line.rstrip("\n").split(":", 2)
+            for controller in controllers.split(",") if controllers else [""]:
+                base = CGROUP if controller == "" else CGROUP + "/" + controller.replace("name=", "")
+                paths[controller] = base + path
+    return paths
+
+
+class CgroupProbe:
+    """
+    Reads the counters of a container from its cgroup files on the host
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        paths = cgroupPaths(pid)
+        self.unified = "cpuacct" not in paths and "" in paths
+        if self.unified:
+            self.cpu = self.memory = self.io = paths[""]
+        else:
+            self.cpu, self.memory, self.io = paths["cpuacct"], paths["memory"], paths["blkio"]
+
+        # fail now rather than on every tick if the files aren't accessible
+        self.probe()
+
+    def probe(self):
+        if self.unified:
+            cpu = readKeys(self.cpu + "/cpu.stat")["usage_usec"] / 1e6
+            rss = readKeys(self.memory + "/memory.stat")["anon"]
+            read, written = 0, 0
+            with open(self.io + "/io.stat") as infile:
+                for line in infile:
+                    for field in line.split()[1:]:
+                        key, _, value = field.partition("=")
+                        if key == "rbytes":
+                            read += int(value)
+                        elif key == "wbytes":
+                            written += int(value)
+        else:
+            with open(self.cpu + "/cpuacct.usage") as infile:
+                cpu = int(infile.read()) / 1e9
+            stat = readKeys(self.memory + "/memory.stat")
+            rss = stat.get("total_rss", stat.get("rss", 0))
+            read, written = 0, 0
+            with open(self.io + "/blkio.throttle.io_service_bytes") as infile:
+                for line in infile:
+                    fields = line.split()
+                    if len(fields) == 3 and fields[1] == "Read":
+                        read += int(fields[2])
+                    elif len(fields) == 3 and fields[1] == "Write":
+                        written += int(fields[2])
+
+        received, sent = readNetwork(self.pid)
+        return [cpu, rss / 1024, read / 1024, written / 1024, received / 1024, sent / 1024]
+
+
+class UnixConnection(HTTPConnection):
+    """
+    http connection to the Docker Engine API on its unix socket
+    """
+
+    def __init__(self, path, timeout):
+        HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ApiProbe:
+    """
+    Reads the counters of a container from a single stats request to the Docker Engine API
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.probe()
+
+    def probe(self):
+        connection = UnixConnection(SOCKET, params.rpcTimeout)
+        try:
+            connection.request("GET", "/containers/" + self.container + "/stats?stream=false&one-shot=true")
+            response = connection.getresponse()
+            if response.status != 200:
+                raise OSError("docker stats of " + self.container + " failed with " + str(response.status))
+            stats = json.loads(response.read())
+        finally:
+            connection.close()
+
+        memory = stats.get("memory_stats", {}).get("stats", {})
+        rss = memory.get("anon", memory.get("total_rss", memory.get("rss", math.nan)))
+
+        read, written = 0, 0
+        for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+            if entry["op"].lower() == "read":
+                read += entry["value"]
+            elif entry["op"].lower() == "write":
+                written += entry["value"]
+
+        networks = (stats.get("networks") or {}).values()
+        received = sum(network["rx_bytes"] for network in networks)
+        sent = sum(network["tx_bytes"] for network in networks)
+
+        cpu = stats["cpu_stats"]["cpu_usage"]["total_usage"] / 1e9
+        return [cpu, rss / 1024, read / 1024, written / 1024, received / 1024, sent / 1024]
+
+
+class Telemetry:
+    """
+    Resource usage of all node containers, one probe per container that can be run concurrently
+    """
+
+    def __init__(self, containers):
+        self.containers = containers
+        self.probes = {}
+
+        pids = {}
+        try:
+            cmd = ["docker", "inspect", "--format", "{{.State.Pid}}"] + containers
+            output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, universal_newlines=True).split()
+            pids = dict(zip(containers, map(int, output)))
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            pass
+
+        for container in containers:
+            for probe in [lambda: CgroupProbe(pids[container]), lambda: ApiProbe(container)]:
+                try:
+                    self.probes[container] = probe()
+                    break
+                except (OSError, KeyError, ValueError):
+                    continue
+            else:
+                print ("Warning: no resource usage of " + container)
+
+    def probe(self, node):
+        """
+        Returns the counters of the container of the given node, see METRICS
+        """
+        probe = self.probes.get(self.containers[node])
+        if probe is not None:
+            try:
+                return probe.probe()
+            except (OSError, KeyError, ValueError):
+                pass
+        return [math.nan] * len(METRICS)
@@ -0,0 +1,210 @@
+"""
+Lightweight disk usage agent, runs inside of a node container next to multichaind
+
+Usage: python3 duagent.py <chain directory> <interval in s>
+
+Watches the chain directory with inotify and only restats files that changed, so the cost
+of a measurement does not grow with the number of files in the chain. Every interval, writes
+a json line to stdout with the disk usage (KB, same as du) of every directory whose size changed,
+relative to the parent of the chain directory, e.g. {"time": ..., "sizes": {"chain1/blocks": 17432}}
+The first line contains all directories. Falls back to rescanning the directory if inotify is unavailable
+
+Is copied into the running containers by diskagent.py, must stay compatible with the python3
+of the node images (3.5 on ubuntu xenial)
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+WATCHMASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct("iIII")
+
+
+def usage(path):
+    """
+    Disk usage of a single file or directory entry in KB, as counted by du
+    """
+    try:
+        return os.lstat(path).st_blocks * 512 // 1024
+    except OSError:
+        return None
+
+
+class Tree:
+    """
+    Keeps the disk usage of every file and directory below root up to date
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.base = os.path.dirname(root)
+        self.files = {}         # path -> KB
+        self.own = {}           # directory -> KB of the directory entry itself
+        self.contents = {}      # directory -> KB of the files directly in it
+        self.watches = {}       # inotify watch descriptor -> directory
+        self.libc, self.fd = None, None
+
+        libname = ctypes.util.find_library("c")
+        if libname:
+            libc = ctypes.CDLL(libname, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK) if hasattr(libc, "inotify_init1") else -1
+            if fd >= 0:
+                self.libc, self.fd = libc, fd
+
+        self.scan(root)
+
+    def watch(self, directory):
+        if self.fd is not None:
+            wd = self.libc.inotify_add_watch(self.fd, directory.encode(), WATCHMASK)
+            if wd >= 0:
+                self.watches[wd] = directory
+
+    def scan(self, directory):
+        """
+        Adds a directory and everything below it
+        """
+        for dirpath, dirnames, filenames in os.walk(directory):
+            own = usage(dirpath)
+            if own is None:
+                continue
+            self.own[dirpath], self.contents[dirpath] = own, 0
+            self.watch(dirpath)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                size = usage(path)
+                if size is not None:
+                    self.files[path] = size
+                    self.contents[dirpath] += size
+
+    def forget(self, directory):
+        """
+        Removes a directory and everything below it
+        """
+        prefix = directory + os.sep
+        for path in [p for p in self.files if p.startswith(prefix)]:
+            del self.files[path]
+        for path in [p for p in self.own if p == directory or p.startswith(prefix)]:
+            del self.own[path], self.contents[path]
+        for wd in [wd for wd, p in self.watches.items() if p == directory or p.startswith(prefix)]:
+            if self.fd is not None:
+                self.libc.inotify_rm_watch(self.fd, wd)
+            del self.watches[wd]
+
+    def restat(self, directory, name):
+        """
+        Updates a single file and the directory entry it lives in
+        """
+        if directory not in self.own:
+            return
+
+        path = os.path.join(directory, name)
+        old, new = self.files.pop(path, 0), usage(path)
+        if new is None or os.path.isdir(path):
+            new = 0
+        else:
+            self.files[path] = new
+
+        self.contents[directory] += new - old
+        self.own[directory] = usage(directory) or self.own[directory]
+
+    def rescan(self):
+        for wd in list(self.watches):
+            if self.fd is not None:
+                self.libc.inotify_rm_watch(self.fd, wd)
+        self.files, self.own, self.contents, self.watches = {}, {}, {}, {}
+        self.scan(self.root)
+
+    def update(self, timeout):
+        """
+        Applies all changes reported by inotify within timeout, or rescans everything without inotify
+        """
+        if self.fd is None:
+            time.sleep(timeout)
+            self.rescan()
+            return
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = EVENT.unpack_from(buf, offset)
+                name = buf[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0").decode()
+                offset += EVENT.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    self.rescan()
+                    return
+                directory = self.watches.get(wd)
+                if directory is None or mask & IN_IGNORED:
+                    continue
+
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.scan(path)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self.forget(path)
+                elif mask & IN_DELETE_SELF:
+                    self.forget(directory)
+                elif name:
+                    self.restat(directory, name)
+
+    def totals(self):
+        """
+        Returns disk usage of all directories including their subdirectories, as du does
+        """
+        totals = dict((d, self.own[d] + self.contents[d]) for d in self.own)
+        for directory in sorted(totals, key=lambda d: d.count(os.sep), reverse=True):
+            parent = os.path.dirname(directory)
+            if directory != self.root and parent in totals:
+                totals[parent] += totals[directory]
+        return dict((os.path.relpath(d, self.base), size) for d, size in totals.items())
+
+
+def main():
+    root, interval = os.path.abspath(sys.argv[1]), float(sys.argv[2])
+    tree = Tree(root)
+    last = {}
+
+    while True:
+        deadline = time.time() + interval
+        while time.time() < deadline:
+            tree.update(max(0, deadline - time.time()))
+
+        sizes = tree.totals()
+        changed = dict((d, size) for d, size in sizes.items() if last.get(d) != size)
+        removed = [d for d in last if d not in sizes]
+        last = sizes
+
+        sys.stdout.write(json.dumps({"time": time.time(), "sizes": changed, "removed": removed}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from blocks import BlockTracker
+
+
+class Chain:
+    """
+    Blocks by height as (block time, tx count, size in KB, hash), served like BlockTracker.fetch
+    """
+
+    def __init__(self, tip):
+        self.blocks = dict((h, (100. * h, 2, 1., "a" + str(h))) for h in range(tip + 1))
+        self.fetched = []
+
+    def fetch(self, first, last):
+        self.fetched.append((first, last))
+        return [(h,) + self.blocks[h] for h in range(first, last + 1)]
+
+
+def tracker(chain):
+    tracker = BlockTracker()
+    tracker.fetch = chain.fetch
+    return tracker
+
+
+def test_new_blocks():
+    chain = Chain(20)
+    blocks = tracker(chain)
+    assert [b[0] for b in blocks.update(10)] == [10]
+    assert [b[0] for b in blocks.update(13)] == [11, 12, 13]
+    assert blocks.update(13) == []
+    assert blocks.chainSize() == 4.
+
+
+def test_replaced_block():
+    chain = Chain(20)
+    blocks = tracker(chain)
+    blocks.update(5)
+    blocks.update(12)
+
+    chain.blocks[11] = (1111., 7, 3., "b11")
+    assert blocks.update(12) == [(11, 1111., 7, 3.)]
+    assert blocks.chainSize() == 8. - 1. + 3.
+    assert chain.fetched[-1] == (7, 12)
+
+
+def test_tip_goes_back():
+    chain = Chain(20)
+    blocks = tracker(chain)
+    blocks.update(5)
+    blocks.update(12)
+
+    chain.blocks[11] = (1111., 7, 3., "b11")
+    assert blocks.update(11) == [(11, 1111., 7, 3.)]
+    assert sorted(blocks.blocks) == list(range(5, 12))
+    assert blocks.chainSize() == 6. + 3.
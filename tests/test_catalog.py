@@ -0,0 +1,58 @@
+import os
+import sqlite3
+
+import pytest
+
+import catalog
+
+
+@pytest.fixture
+def datadir(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "DATADIR", str(tmp_path))
+    monkeypatch.setattr(catalog, "CATALOG", str(tmp_path / "catalog.db"))
+    return tmp_path
+
+
+def addRun(datadir, name, created, txSize=128):
+    directory = datadir / name
+    directory.mkdir()
+    (directory / "params.py").write_text("offchain = True\ntxSize = " + str(txSize) + "\n")
+    os.utime(directory / "params.py", (created, created))
+    return str(directory)
+
+
+def test_order_by_created(datadir):
+    addRun(datadir, "testfiles-offchain-2", 1000)
+    addRun(datadir, "testfiles-offchain-10", 3000)
+    addRun(datadir, "testfiles-onchain-0", 2000)
+
+    names = [os.path.basename(run["directory"]) for run in catalog.query(orderBy="created")]
+    assert names == ["testfiles-offchain-2", "testfiles-onchain-0", "testfiles-offchain-10"]
+    assert [os.path.basename(run["directory"]) for run in catalog.query()] == sorted(names)
+
+    with pytest.raises(ValueError):
+        catalog.query(orderBy="created; DROP TABLE runs")
+
+
+def test_runs_added_later_are_indexed(datadir):
+    addRun(datadir, "testfiles-offchain-0", 1000)
+    assert len(catalog.query()) == 1
+
+    directory = addRun(datadir, "testfiles-offchain-1", 2000, txSize=64)
+    assert [run["directory"] for run in catalog.query(txSize=64)] == [directory]
+
+
+def test_own_connections_are_closed(datadir, monkeypatch):
+    opened = []
+    connect = catalog.connect
+    monkeypatch.setattr(catalog, "connect", lambda: opened.append(connect()) or opened[-1])
+
+    directory = addRun(datadir, "testfiles-offchain-0", 1000)
+    catalog.register(directory)
+    catalog.recordSummary(directory)
+    catalog.query()
+    assert len(opened) == 3
+
+    for connection in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
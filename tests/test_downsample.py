@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from downsample import decimate, lttb, minMax
+
+
+def series(N=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(N, dtype=float)
+    return x, np.cumsum(rng.normal(0, 1, N))
+
+
+def test_lttb_keeps_endpoints_and_count():
+    x, y = series()
+    dx, dy = lttb(x, y, 500)
+    assert len(dx) == 500
+    assert (dx[0], dy[0]) == (x[0], y[0])
+    assert (dx[-1], dy[-1]) == (x[-1], y[-1])
+    assert np.all(np.diff(dx) > 0)
+    assert np.array_equal(dy, y[dx.astype(int)])
+
+
+def test_lttb_keeps_spike():
+    x, y = np.arange(1000, dtype=float), np.zeros(1000)
+    y[537] = 100
+    dx, dy = lttb(x, y, 50)
+    assert 537 in dx
+
+
+def test_short_series_unchanged():
+    x, y = series(100)
+    for method in ["lttb", "minmax"]:
+        dx, dy = decimate(x, y, 1000, method)
+        assert np.array_equal(dx, x) and np.array_equal(dy, y)
+
+
+def test_minmax_envelope():
+    x, y = series()
+    dx, dy = minMax(x, y, 200)
+    assert len(dx) <= 200
+    assert np.all(np.diff(dx) > 0)
+    assert dy.max() == y.max() and dy.min() == y.min()
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax", None])
+def test_decimate_drops_nan(method):
+    x, y = series(5000)
+    y[::7] = np.nan
+    dx, dy = decimate(x.reshape(-1, 1), y.reshape(-1, 1), 300, method)
+    assert not np.any(np.isnan(dy))
+    assert len(dx) <= (300 if method else len(x))
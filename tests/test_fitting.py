@@ -0,0 +1,78 @@
+import numpy as np
+
+from fitting import OnlineFit, converged, fitColumns, fitRuns
+
+
+def sample(n=200, columns=3, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.arange(n) * 5. + 1e6
+    data = 100 + time.reshape(-1, 1) * np.arange(1, columns + 1) * 0.5 + rng.normal(0, 20, (n, columns))
+    return time, data
+
+
+def lstsq(time, column):
+    A = np.vstack((np.ones_like(time), time)).T
+    return np.linalg.lstsq(A, column, rcond=None)[0]
+
+
+def test_columns_match_lstsq():
+    time, data = sample()
+    fit = fitColumns(time, data)
+    for j in range(data.shape[1]):
+        intercept, slope = lstsq(time, data[:, j])
+        assert np.isclose(fit.slope[j], slope)
+        assert np.isclose(fit.intercept[j], intercept)
+    assert np.all(fit.n == len(time))
+
+
+def test_startrow_per_column_and_nan():
+    time, data = sample()
+    data[7, 1] = np.nan
+    startrows = np.array([0, 50, 120])
+    fit = fitColumns(time, data, startrows)
+    for j, start in enumerate(startrows):
+        keep = (np.arange(len(time)) >= start) & ~np.isnan(data[:, j])
+        assert np.isclose(fit.slope[j], lstsq(time[keep], data[keep, j])[1])
+        assert fit.n[j] == keep.sum()
+
+
+def test_runs_of_different_lengths():
+    first, second = sample(200, 3, 1), sample(80, 2, 2)
+    fits = fitRuns([(first[0], first[1], 10), (second[0], second[1], 0)])
+    for (time, data), start, fit in zip([first, second], [10, 0], fits):
+        expected = fitColumns(time, data, start)
+        assert np.allclose(fit.slope, expected.slope)
+        assert np.allclose(fit.ci, expected.ci)
+
+
+def test_empty_input():
+    assert fitRuns([]) == []
+    assert fitColumns([], []).slope.shape == (0,)
+    fit = fitColumns(np.zeros(0), np.zeros((0, 2)))
+    assert np.all(np.isnan(fit.slope)) and np.all(fit.n == 0)
+
+
+def test_online_matches_batch():
+    time, data = sample()
+    online = OnlineFit(data.shape[1])
+    for t, row in zip(time, data):
+        online.update(t, row)
+
+    fit, batch = online.fit(), fitColumns(time, data)
+    for field in ["slope", "intercept", "stderr", "residual", "ci"]:
+        assert np.allclose(getattr(fit, field), getattr(batch, field))
+    assert np.allclose(online.project(time[-1]), batch.intercept + batch.slope * time[-1])
+
+
+def test_online_needs_three_points():
+    online = OnlineFit(2)
+    online.update(0, [0, 0])
+    online.update(5, [1, 2])
+    assert online.fit() is None
+    assert not converged(online.fit(), 0.05, 0.01)
+
+
+def test_converged():
+    time = np.arange(100) * 5.
+    exact = fitColumns(time, np.vstack((time * 2, np.zeros_like(time))).T)
+    assert converged(exact, 0.05, 0.01)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from helpers import getTxpm, getTxpmStack
+import planner
+
+
+def trainingData(rows=300, seed=0, noise=0.5):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 500, (rows, 3))
+    Y = 1 + X @ [0.02, 0.01, 0.001] + rng.normal(0, noise, rows)
+    w = rng.uniform(100, 1000, rows)
+    return np.column_stack((X, Y, w))
+
+
+def test_fit_recovers_coefficients():
+    model = planner.fitModel(trainingData())
+    assert np.allclose(model.coef, [1, 0.02, 0.01, 0.001], atol=0.2)
+    assert np.allclose(model.coef[1:], [0.02, 0.01, 0.001], atol=0.002)
+    assert model.dof == 300 - 4
+
+
+def test_fit_matches_weighted_lstsq():
+    data = trainingData(50, seed=1)
+    model = planner.fitModel(data)
+    A = np.column_stack((np.ones(50), data[:, :3])) * np.sqrt(data[:, 4:5])
+    assert np.allclose(model.coef, np.linalg.lstsq(A, data[:, 3] * np.sqrt(data[:, 4]), rcond=None)[0])
+
+
+def test_rows_of_weight_zero_are_ignored():
+    data = trainingData(50)
+    padded = np.vstack((np.zeros((1, 5)), data))
+    assert np.allclose(planner.fitModel(padded).coef, planner.fitModel(data).coef)
+    with pytest.raises(ValueError):
+        planner.fitModel(data[:4])
+
+
+def test_features_per_scenario():
+    txpm = np.array([[[0, 2, 0], [1, 0, 0], [0, 0, 0]]], dtype=float)
+    sizes = np.array([[[0, 10, 0], [5, 0, 0], [0, 0, 0]]], dtype=float)
+    X = planner.features(txpm, sizes)
+    assert np.array_equal(X[0], [[20, 5, 0], [5, 20, 0], [0, 0, 25]])
+
+
+def test_predict_stack_matches_single_scenarios():
+    model = planner.fitModel(trainingData())
+    rng = np.random.default_rng(2)
+    txpm = rng.uniform(0, 10, (100, 4, 4))
+    sizes = rng.uniform(1, 128, (100, 4, 1))
+
+    plan = planner.predict(model, txpm, sizes)
+    assert plan.mean.shape == (100, 4)
+    assert np.all(plan.lower < plan.mean) and np.all(plan.mean < plan.upper)
+
+    for s in [0, 57]:
+        single = planner.predict(model, txpm[s:s + 1], sizes[s:s + 1])
+        assert np.allclose(single.mean[0], plan.mean[s])
+        assert np.allclose(single.upper[0], plan.upper[s])
+
+    # KB/s of a single node from the coefficients, in GB per year
+    X = planner.features(txpm[:1], sizes[:1])[0, 0]
+    assert np.isclose(plan.mean[0, 0], (model.coef[0] + X @ model.coef[1:]) * planner.CONVERSION)
+
+
+def test_rank_by_peak_node():
+    plan = planner.Plan(np.array([[1., 5.], [7., 2.], [3., 3.]]), None, np.array([[2., 6.], [8., 3.], [9., 4.]]))
+    assert list(planner.rank(plan)) == [2, 1, 0]
+    assert list(planner.rank(plan, "mean")) == [1, 0, 2]
+
+
+def test_txpm_stack_matches_getTxpm():
+    tx = {"a": 10000, "b": 50000, "c": 3000}
+    labels, txpm = getTxpm(tx)
+    stack = getTxpmStack([[10000, 50000, 3000], [0, 0, 0]])
+    assert labels == ["a", "b", "c"]
+    assert np.array_equal(stack[0], txpm)
+    assert not stack[1].any()
+    assert np.isclose(txpm[1, 3], 50000 / (60 * 24 * 365.23))
+
+
+def test_learn_without_runs(monkeypatch):
+    import catalog
+    monkeypatch.setattr(catalog, "query", lambda **filters: [])
+    with pytest.raises(ValueError, match="no finished runs match the filter"):
+        planner.learn(True, 999)
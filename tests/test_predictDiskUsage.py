@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import predictDiskUsage
+
+
+def test_resamples_whole_runs():
+    groups = np.repeat([0, 1, 2, 3], [2, 3, 4, 5])
+    samples = predictDiskUsage.resampleRuns(groups, 50, np.random.default_rng(0))
+    assert len(samples) == 50
+    for sample in samples:
+        runs, counts = np.unique(groups[sample], return_counts=True)
+        assert np.all(counts % np.bincount(groups)[runs] == 0)
+
+
+def test_bootstrap_needs_a_sample():
+    X = np.arange(12.).reshape(4, 3)
+    with pytest.raises(ValueError):
+        predictDiskUsage.bootstrap(X, X.sum(axis=1), np.ones(4), np.array([0, 0, 1, 1]), count=0, jobs=1)
+
+
+def test_bootstrap_intervals_contain_the_fit():
+    rng = np.random.default_rng(1)
+    groups = np.repeat(np.arange(8), 4)
+    X = rng.uniform(0, 100, (32, 3))
+    Y = 1 + X @ [0.5, 0.2, 0.1] + rng.normal(0, 1, 8)[groups]
+    lower, upper = predictDiskUsage.bootstrap(X, Y, np.ones(32), groups, count=200, jobs=1)
+
+    fitted = predictDiskUsage.fitWeighted(next(iter(predictDiskUsage.MODELS.values())), X, Y, np.ones(32))
+    coef = np.concatenate(([fitted.intercept_], fitted.coef_))
+    assert np.all(lower < coef) and np.all(coef < upper)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import params
+import sinks
+
+
+@pytest.mark.parametrize("backend", ["csv", "binary", "sqlite"])
+def test_two_tables(tmp_path, monkeypatch, backend):
+    # keep everything buffered, so both tables have unflushed writes at the same time
+    monkeypatch.setattr(params, "flushInterval", 3600)
+    directory = str(tmp_path)
+
+    measurements = sinks.openTable(directory, "measurements", ["time", "size"], backend)
+    blocks = sinks.openTable(directory, "blocks", ["height", "size", "seen"], backend)
+    for i in range(10):
+        measurements.write([i * 5., i * 1.5])
+        blocks.write([i, i * 0.25, i * 5.])
+    sinks.closeAll()
+
+    assert np.array_equal(sinks.readTable(directory, "measurements"), [[i * 5., i * 1.5] for i in range(10)])
+    assert np.array_equal(sinks.readTable(directory, "blocks"), [[i, i * 0.25, i * 5.] for i in range(10)])
+
+
+def test_missing_table(tmp_path):
+    directory = str(tmp_path)
+    table = sinks.openTable(directory, "measurements", ["time"], "sqlite")
+    table.write([1.])
+    table.close()
+
+    with pytest.raises(FileNotFoundError):
+        sinks.readTable(directory, "blocks")
+
+
+def test_binary_readers_agree(tmp_path):
+    import diskstore
+    import runData
+
+    directory = str(tmp_path)
+    table = sinks.openTable(directory, "measurements", ["time", "size"], "binary")
+    table.close()
+    assert sinks.readTable(directory, "measurements").shape == (0, 2)
+
+    table = sinks.openTable(directory, "measurements", ["time", "size"], "binary")
+    for i in range(4):
+        table.write([i * 5., i * 1.5])
+    table.close()
+    with open(directory + "/measurements.dat", "ab") as outfile:
+        outfile.write(np.zeros(1, dtype=sinks.DTYPE).tobytes())
+
+    expected = [[i * 5., i * 1.5] for i in range(4)]
+    assert np.array_equal(sinks.readTable(directory, "measurements"), expected)
+    assert np.array_equal(runData.load(directory, "measurements"), expected)
+
+    store = diskstore.DiskStore(directory, 0)
+    store.append(5., {"chain1": 10.})
+    store.append(10., {"chain1": 12., "chain1/blocks": 4.})
+    store.close()
+    columns, records = diskstore.read(directory, 0)
+    assert columns == ["time", "chain1", "chain1/blocks"]
+    assert np.array_equal(records, [[5., 10., np.nan], [10., 12., 4.]], equal_nan=True)
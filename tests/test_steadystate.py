@@ -0,0 +1,69 @@
+import numpy as np
+
+from fitting import fitColumns
+import sinks
+import steadystate
+
+
+def noisy(y, seed=0, sigma=5):
+    return y + np.random.default_rng(seed).normal(0, sigma, len(y))
+
+
+def assertSteady(time, data, rows, slopes):
+    """
+    Warm-up is cut off just enough that the fitted slopes are within the tolerance of the steady ones,
+    which they are not when fitting all samples
+    """
+    margin = np.maximum(steadystate.TOLERANCE * np.abs(slopes), steadystate.FLOOR)
+    assert np.all(np.abs(fitColumns(time, data, rows).slope - slopes) <= margin)
+    warm = rows > 0
+    assert np.all(np.abs(fitColumns(time, data).slope - slopes)[warm] > margin[warm])
+
+
+def test_ramp_then_plateau():
+    # fast growth while warming up, then a steady plateau from t = 1000 s on
+    time = np.arange(1000) * 5.
+    data = np.vstack((
+        noisy(np.minimum(time, 1000) * 4),
+        noisy(time * 2, seed=1),
+        noisy(np.zeros_like(time), seed=2, sigma=0.5),
+    )).T
+
+    rows = steadystate.changePoints(time, data)
+    assert 0 < rows[0] <= 200
+    assert rows[1] == 0
+    assert rows[2] == 0
+    assertSteady(time, data, rows, np.array([0, 2, 0]))
+    assert steadystate.steadyStart(time, data) == rows[0]
+
+
+def test_knee_in_linear_growth():
+    time = np.arange(2000) * 5.
+    data = noisy(np.where(time < 900, time * 3, 2700 + (time - 900))).reshape(-1, 1)
+    rows = steadystate.changePoints(time, data)
+    assert 0 < rows[0] <= 180
+    assertSteady(time, data, rows, np.array([1]))
+
+
+def test_too_few_rows():
+    time = np.arange(steadystate.MINROWS - 1) * 5.
+    assert np.array_equal(steadystate.changePoints(time, np.vstack((time ** 2, time)).T), [0, 0])
+
+
+def test_window_is_cached(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    time = np.arange(600) * 5.
+    table = sinks.openTable(directory, "measurements", ["time", "chain size", "items", "node0"], "csv")
+    for t, y in zip(time, noisy(np.where(time < 600, time * 3, 1200 + time))):
+        table.write([t, 0, 0, y])
+    table.close()
+
+    window = steadystate.window(directory)
+    assert window["startrow"][0] == 0 and window["startrow"][1] == 0
+    assert 0 < window["startrow"][2] <= 120
+    assert window["startTime"][2] == time[window["startrow"][2]]
+
+    # a second call reads steadystate.json instead of detecting again
+    monkeypatch.setattr(steadystate, "changePoints", None)
+    assert steadystate.window(directory) == window
+    assert np.array_equal(steadystate.startrows(directory), window["startrow"])
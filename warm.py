@@ -0,0 +1,89 @@
+"""
+Keeps the network warm across test runs
+
+Images are tagged with a hash of the files they are built from and only rebuilt when these change.
+With params.keepWarm, the network is left running after a test, and a snapshot of every node is
+taken right after the chain has been initialized for the first time (committed as a docker image).
+The next run recreates the containers from their snapshots, which resets the chain state to a freshly
+initialized chain without building images or bootstrapping a new chain
+"""
+
+import hashlib
+import json
+import subprocess
+
+from helpers import *
+import params
+
+
+# files the images of the master and slave nodes are built from
+IMAGES = [
+    "templates/master/Dockerfile",
+    "templates/master/runchain.sh",
+    "templates/node/Dockerfile",
+    "templates/node/runchain.sh",
+]
+
+# files that, on top of the images, determine the state of a fresh chain, JMeter's testplan doesn't
+CHAIN = [
+    "templates/docker-compose-template.yml",
+]
+
+
+def templateHash(paths, extra=None):
+    """
+    Hash over the given template files, and over extra (anything json serializable) if given
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode())
+        with open(path, "rb") as infile:
+            digest.update(infile.read())
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+
+def imageTag(kind):
+    """
+    Tag of the image built for the master or slave nodes ("master" or "node"), the same for all
+    parameters, so only changes to the images themselves cause a rebuild
+    """
+    return "multichain-benchmark-" + kind + ":" + templateHash(IMAGES)
+
+
+def snapshotTag(i):
+    """
+    Tag of the snapshot of a freshly initialized node i, which also depends on the chain parameters
+    """
+    tag = templateHash(IMAGES + CHAIN, [params.chain, params.numNodes, params.containerName])
+    return "multichain-benchmark-" + params.containerName + str(i) + ":" + tag
+
+
+def imageExists(tag):
+    return subprocess.call("docker image inspect " + tag, shell=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+def imagesBuilt():
+    return imageExists(imageTag("master")) and imageExists(imageTag("node"))
+
+
+def hasSnapshot():
+    return all(imageExists(snapshotTag(i)) for i in range(params.numNodes))
+
+
+def takeSnapshot():
+    """
+    Stops multichaind on all nodes (slave nodes first), commits each stopped container
+    as its snapshot image and starts the network again
+    """
+    print ("Taking snapshot of the fresh chain ...")
+    for i in list(range(1, params.numNodes)) + [0]:
+        rpc(i, "stop")
+        subprocess.call("docker wait " + params.containerName + str(i), shell=True, stdout=subprocess.DEVNULL)
+
+    for i in range(params.numNodes):
+        subprocess.call("docker commit " + params.containerName + str(i) + " " + snapshotTag(i), shell=True)
+
+    compose("up -d")